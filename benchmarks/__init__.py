@@ -0,0 +1 @@
+# 内置命令的性能基准测试，运行方式：python -m benchmarks --help
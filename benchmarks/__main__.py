@@ -0,0 +1,199 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from prompt_toolkit.application.current import create_app_session
+from prompt_toolkit.data_structures import Size
+from prompt_toolkit.output.vt100 import Vt100_Output
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cmds import Cmd                                # noqa: E402
+from cmds.ls import LsCommand                       # noqa: E402
+from benchmarks.fixtures import build_fixtures      # noqa: E402
+
+REGRESSION_THRESHOLD = 1.10     # 对比时中位数变慢超过 10% 视为退化
+
+
+class Case(NamedTuple):
+    """
+    一个测试用例。command 中的 {名称} 会被替换为夹具路径，{scratch} 为每个用例独立的临时目录。
+    run 不为空时直接计时该函数，不经过 Cmd。setup 在每次计时前执行，不计入耗时。
+    """
+    name: str
+    command: str = ''
+    run: Optional[Callable[[Dict[str, str]], None]] = None
+    setup: Optional[Callable[[Dict[str, str]], None]] = None
+
+
+def complete_path(paths: Dict[str, str]):
+    """
+    模拟 main.py 中按 Tab 补全路径：列出目录并按前缀筛选文件名。
+    """
+    lister = LsCommand('')
+    for prefix in ('entry0', 'entry04', 'entry049'):
+        [info for info in lister.get_file_info_list(paths['wide'])
+         if os.path.basename(info["fullpath"]).startswith(prefix)]
+
+
+def clear_scratch(paths: Dict[str, str]):
+    shutil.rmtree(paths['scratch'], ignore_errors=True)
+    os.makedirs(paths['scratch'])
+
+
+def copy_small_to_scratch(paths: Dict[str, str]):
+    clear_scratch(paths)
+    shutil.copytree(paths['small'], os.path.join(paths['scratch'], 'small'))
+
+
+CASES: List[Case] = [
+    Case("ls-wide", "ls {wide}"),
+    Case("ls-l-R-small", "ls -l -R {small}"),
+    Case("ls-l-R-deep", "ls -l -R {deep}"),
+    Case("grep-huge", "grep -e error {huge_file}"),
+    Case("grep-i-n-huge", "grep -i -n -e TIMEOUT {huge_file}"),
+    Case("grep-v-huge", "grep -v -e error {huge_file}"),
+    Case("grep-r-small", "grep -r -e timeout {small}"),
+    Case("wc-huge-dir", "wc {huge}"),
+    Case("wc-l-huge", "wc -l {huge_file}"),
+    Case("head-huge", "head -n 100 {huge_file}"),
+    Case("tail-huge", "tail -n 100 {huge_file}"),
+    Case("cat-huge", "cat {huge_file}"),
+    Case("sed-huge", "sed -e s/error/ERROR/ {huge_file}"),
+    Case("cp-r-small", "cp -r {small} {scratch}/small", setup=clear_scratch),
+    Case("rm-r-small", "rm -r {scratch}/small", setup=copy_small_to_scratch),
+    Case("tar-c-huge", "tar -c -f {scratch}/huge.tar {huge}", setup=clear_scratch),
+    Case("tar-x-huge", "tar -x -f {archive} -C {scratch}", setup=clear_scratch),
+    Case("tab-complete-wide", run=complete_path),
+    Case("pipe-cat-grep-wc", "cat {huge_file} | grep -e error | wc -l"),
+    Case("pipe-cat-head", "cat {huge_file} | head -n 10"),
+    Case("pipe-grep-sed-tail", "grep -e timeout {huge_file} | sed -e s/timeout/TIMEOUT/ | tail -n 5"),
+    Case("redirect-grep", "grep -e error {huge_file} > {scratch}/out.txt", setup=clear_scratch),
+]
+
+
+@contextmanager
+def off_terminal():
+    """
+    把命令的输出（包括 prompt_toolkit 的渲染）写到空设备，渲染开销仍然计入耗时。
+    """
+    with open(os.devnull, 'w', encoding='utf-8') as sink, redirect_stdout(sink), redirect_stderr(sink):
+        output = Vt100_Output(sink, lambda: Size(rows=40, columns=120), term='xterm-256color')
+        with create_app_session(output=output):
+            yield
+
+
+def run_case(case: Case, paths: Dict[str, str], repeat: int) -> dict:
+    """
+    重复执行一个用例并记录每次的耗时（秒）。
+    """
+    paths = dict(paths, scratch=os.path.join(paths['scratch_root'], case.name))
+    os.makedirs(paths['scratch'], exist_ok=True)
+    command = case.command.format(**paths)
+    runs, status = [], 0
+    for _ in range(repeat):
+        if case.setup:
+            case.setup(paths)
+        with off_terminal():
+            start = time.perf_counter()
+            if case.run:
+                case.run(paths)
+            else:
+                status = Cmd(command).status
+            runs.append(time.perf_counter() - start)
+    return {
+        "command": case.command or case.run.__name__,
+        "status": status,
+        "runs": runs,
+        "min": min(runs),
+        "median": statistics.median(runs),
+        "mean": statistics.mean(runs),
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict):
+    """
+    按中位数对比两次运行的结果，打印每个用例的变化比例。
+    """
+    print(f"{'case':<24}{'base (s)':>12}{'now (s)':>12}{'ratio':>9}")
+    for name, result in results["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<24}{'-':>12}{result['median']:>12.4f}{'new':>9}")
+            continue
+        ratio = result["median"] / base["median"] if base["median"] else float('inf')
+        mark = "  <- slower" if ratio > REGRESSION_THRESHOLD else ""
+        print(f"{name:<24}{base['median']:>12.4f}{result['median']:>12.4f}{ratio:>8.2f}x{mark}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark the builtin commands.")
+    parser.add_argument("-s", "--scale", type=float, default=1.0, help="Fixture size factor (default: 1.0)")
+    parser.add_argument("-n", "--repeat", type=int, default=3, help="Runs per case (default: 3)")
+    parser.add_argument("-k", "--filter", type=str, help="Only run cases whose name contains this string")
+    parser.add_argument("-o", "--output", type=str, help="Write JSON results to this file")
+    parser.add_argument("-c", "--compare", type=str, help="Compare with a previous JSON result file")
+    parser.add_argument("--fixtures", type=str, help="Reuse (or create) fixtures in this directory")
+    args = parser.parse_args(argv)
+
+    cases = [case for case in CASES if not args.filter or args.filter in case.name]
+    root = os.path.abspath(args.fixtures) if args.fixtures else tempfile.mkdtemp(prefix="shell-bench-")
+    cwd = os.getcwd()
+    try:
+        start = time.perf_counter()
+        paths = build_fixtures(root, args.scale)
+        paths['scratch_root'] = os.path.join(root, "scratch")
+        print(f"fixtures ready in {time.perf_counter() - start:.2f}s: {root}", file=sys.stderr)
+
+        results = {
+            "meta": {
+                "revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "scale": args.scale,
+                "repeat": args.repeat,
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            "results": {},
+        }
+        os.chdir(root)
+        for case in cases:
+            result = run_case(case, paths, args.repeat)
+            results["results"][case.name] = result
+            print(f"{case.name:<24}{result['median']:>10.4f}s  (min {result['min']:.4f}s, status {result['status']})",
+                  file=sys.stderr)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(os.path.join(root, "scratch"), ignore_errors=True)
+        if not args.fixtures:
+            shutil.rmtree(root, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
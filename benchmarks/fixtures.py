@@ -0,0 +1,93 @@
+import os
+import random
+import shutil
+import tarfile
+from typing import Dict
+
+# 生成文本时使用的词表，保证内容可读且 grep、sed 有稳定的命中率
+WORDS = ["alpha", "beta", "gamma", "delta", "error", "warning", "info", "debug",
+         "request", "response", "timeout", "socket", "buffer", "thread", "process", "cache"]
+
+
+def write_text_file(path: str, lines: int, rng: random.Random):
+    """
+    生成一个文本文件，每行是行号加若干随机单词。
+
+    :param path: 文件路径。
+    :param lines: 行数。
+    :param rng: 随机数生成器，使用固定种子保证每次生成的内容相同。
+    """
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        for i in range(lines):
+            f.write(f"{i} {' '.join(rng.choices(WORDS, k=rng.randint(4, 12)))}\n")
+
+
+def fixture_paths(root: str) -> Dict[str, str]:
+    """
+    返回 root 下各个夹具的路径，不生成文件。
+
+    :return: {名称: 路径}，测试用例中的命令通过这些名称引用路径。
+    """
+    paths = {name: os.path.join(root, name) for name in ('small', 'huge', 'deep', 'wide')}
+    paths['huge_file'] = os.path.join(paths['huge'], "huge0.log")
+    paths['archive'] = os.path.join(root, "huge.tar")
+    return paths
+
+
+def build_fixtures(root: str, scale: float = 1.0, seed: int = 0) -> Dict[str, str]:
+    """
+    在 root 下生成基准测试使用的目录树：
+      small/  大量小文件，分布在若干子目录中
+      huge/   少量大文件
+      deep/   深层嵌套的目录
+      wide/   单层包含大量条目的目录
+    以及 huge.tar，供 tar -x 使用。
+
+    已经用相同参数生成过的目录直接复用，不会重新生成。
+
+    :param root: 生成目录，已存在的同名文件会被覆盖。
+    :param scale: 规模系数，文件数量和大文件行数按比例缩放。
+    :param seed: 随机种子。
+    :return: 同 fixture_paths。
+    """
+    paths = fixture_paths(root)
+    marker = os.path.join(root, f".complete-{scale}-{seed}")
+    if os.path.exists(marker):
+        return paths
+
+    rng = random.Random(seed)
+    n = lambda count: max(1, int(count * scale))
+    for name in ('small', 'huge', 'deep', 'wide'):
+        shutil.rmtree(paths[name], ignore_errors=True)
+        os.makedirs(paths[name])
+
+    # 大量小文件：20 个子目录，每个 100 个文件
+    for d in range(n(20)):
+        subdir = os.path.join(paths['small'], f"dir{d:03d}")
+        os.makedirs(subdir, exist_ok=True)
+        for i in range(n(100)):
+            write_text_file(os.path.join(subdir, f"file{i:04d}.txt"), rng.randint(1, 50), rng)
+
+    # 少量大文件：每个约 20 万行
+    for i in range(3):
+        write_text_file(os.path.join(paths['huge'], f"huge{i}.log"), n(200_000), rng)
+
+    # 深层嵌套：每层一个文件
+    level = paths['deep']
+    for depth in range(n(50)):
+        level = os.path.join(level, f"level{depth:03d}")
+        os.makedirs(level, exist_ok=True)
+        write_text_file(os.path.join(level, "data.txt"), 20, rng)
+
+    # 宽目录：单层大量空文件，Tab 补全和 ls 的典型压力场景
+    for i in range(n(5000)):
+        open(os.path.join(paths['wide'], f"entry{i:05d}.dat"), 'w').close()
+
+    with tarfile.open(paths['archive'], 'w') as tar:
+        tar.add(paths['huge'], arcname='huge')
+
+    for old in os.listdir(root):
+        if old.startswith(".complete-"):
+            os.remove(os.path.join(root, old))
+    open(marker, 'w').close()
+    return paths
@@ -1,75 +1,199 @@
 import os
-import io
-import re
 import inspect
-from prompt_toolkit.application.current import get_app_session
-from prompt_toolkit.output.defaults import create_output
+import functools
+import threading
+import subprocess
+from cmds.core.pipeline import Pipeline, POLL_INTERVAL
+from cmds.core.registry import registry
+from cmds.core.syntax import parse, ShellSyntaxError
+from cmds.base import Command
 
-commands = []
-cur_dir = os.path.dirname(__file__)
-for file in os.listdir(cur_dir):
-    file_path = os.path.join(cur_dir, file)
-    if os.path.isfile(file_path) and file.endswith('.py') and file not in ['base.py', '__init__.py']:
-        commands.append(file[:-3])
+IO_BUFFER_SIZE = 1 << 20    # 重定向读写文件时使用的缓冲区大小
 
-for command in commands:
-    exec(f"from cmds.{command} import {command.capitalize()}Command")
+# 所有内置命令名，命令模块在第一次使用时才导入
+commands = list(registry)
 
 class Cmd:
     def __init__(self, cmd):
-        # 解析命令，判断是否有管道符
-        if '|' in cmd:
-            self._handle_pipe(cmd)
-        else:
-            self._execute_single_command(cmd, input_lines=None, last=True)
+        self._processes = []    # 管道中启动的外部命令
+        self.status = 0         # 最后一条命令的退出状态
+        # 解析命令行，得到用 ;、&&、|| 连接的若干管道；相同的命令行只解析一次
+        try:
+            command_line = parse(cmd)
+        except ShellSyntaxError as e:
+            print(f"Syntax error: {e}")
+            self.status = 2
+            return
+        for connector, chain in command_line.items:
+            if connector == '&&' and self.status != 0:
+                continue
+            if connector == '||' and self.status == 0:
+                continue
+            # time 前缀：统计管道中每一级的耗时和数据量；cProfile 和 pstats 只在使用 time 时才导入
+            profiler = None
+            if chain.timed is not None:
+                from cmds.core.profile import Profiler
+                profiler = Profiler([node.text for node in chain.commands], chain.timed)
+            if len(chain.commands) > 1:
+                self.status = self._handle_pipe(chain, profiler)
+            elif profiler is not None:
+                self.status = profiler.consumer(0, functools.partial(self._execute_single_command, chain.commands[0]))()
+            else:
+                self.status = self._execute_single_command(chain.commands[0], input_lines=None)
+            if profiler is not None:
+                profiler.report()
             
-    def _handle_pipe(self, cmd):
-        # 按照管道符分割命令
-        sub_commands = cmd.split('|')
-        
-        # 初始化第一个命令的输入流为 None
-        input_lines = None
-        for i, sub_cmd in enumerate(sub_commands):
-            sub_cmd = sub_cmd.strip()  # 去除多余的空格
-            is_last = (i == len(sub_commands) - 1)  # 判断是否是最后一条命令
-            # 使用 StringIO 捕获前一个命令的输出
-            input_lines = self._execute_single_command(sub_cmd, input_lines=input_lines, last=is_last)
+    def _handle_pipe(self, chain, profiler=None):
+        # 前面的每条命令在各自的线程中运行，通过有界队列把输出逐批传给下一级，最后一条命令负责输出到终端
+        # 下游命令（如 head）结束后，上游命令也随之停止，不会把整个输出读入内存
+        producers = [functools.partial(self._stream_single_command, node) for node in chain.commands[:-1]]
+        consumer = functools.partial(self._execute_single_command, chain.commands[-1])
+        if profiler is not None:
+            producers = [profiler.producer(i, producer) for i, producer in enumerate(producers)]
+            consumer = profiler.consumer(len(producers), consumer)
+        pipeline = Pipeline(producers, consumer)
+        pipeline.on_cancel.append(self._kill_processes)
+        return pipeline.run()
+
+    def _kill_processes(self):
+        """
+        结束管道中仍在运行的外部命令。
+        """
+        for process in self._processes:
+            self._kill_process(process)
+
+    @staticmethod
+    def _kill_process(process):
+        """
+        结束外部命令。shell=True 时真正的命令是 shell 的子进程，需要连同子进程一起结束。
+        """
+        if process.poll() is not None:
+            return
+        import psutil
+        try:
+            children = psutil.Process(process.pid).children(recursive=True)
+        except psutil.Error:
+            children = []
+        process.kill()
+        for child in children:
+            try:
+                child.kill()
+            except psutil.Error:
+                pass
     
-    def _execute_single_command(self, cmd, input_lines=None, last=False):
-        if len(cmd.split()) == 0:
-            return None  # 空命令不执行
-        type = cmd.split()[0]
-        command = ' '.join(cmd.split()[1:])
-        # input((cmd, last))
-        # 如果当前命令是最后一个命令，输出到标准输出
-        if not last:
-            app = get_app_session()    
-            original_stdout = app._output
-            app._output = create_output(stdout=io.StringIO())
-        
-        # 执行命令
-        if type in commands:
+    def _stream_single_command(self, node, input_lines=None):
+        """
+        以生成器的形式执行管道中间的一条命令，逐行产出其输出。
+        """
+        if node.name in registry:
             try:
-                # 如果有输入流，就传递给 execute 的 stream 参数
-                command_class = eval(f"{type.capitalize()}Command(command)")
-                # 判断command_class.execute是否有stream参数，如果有就传递input_lines
-                if len(inspect.signature(command_class.execute).parameters) == 1:
+                input_lines, output = self._redirect(node, input_lines)
+                command_class = registry.get(node.name)(node.args)
+            except Exception as e:
+                print(f"Error executing command '{node.name}': {e}")
+                return
+            if output is not None:
+                # 输出被重定向到文件时，下一级命令得不到任何输入
+                self._write_output(command_class, input_lines, output)
+                return
+            yield from command_class.stream(input_lines=input_lines)
+        else:
+            # 如果命令不是我们定义的，则启动子进程并逐行读取其输出
+            process = self._spawn(node.text, input_lines, stdout=subprocess.PIPE)
+            try:
+                for line in process.stdout:
+                    yield line.rstrip('\r\n')
+            finally:
+                process.stdout.close()
+                self._kill_process(process)
+                process.wait()
+
+    def _execute_single_command(self, node, input_lines=None):
+        """
+        执行一条命令（或管道的最后一级），输出直接打印到标准输出或写入重定向的文件。
+
+        :return: 命令的退出状态。
+        """
+        if node.name in registry:
+            try:
+                input_lines, output = self._redirect(node, input_lines)
+                command_class = registry.get(node.name)(node.args)
+                if output is not None:
+                    self._write_output(command_class, input_lines, output)
+                # 判断command_class.execute是否有input_lines参数，如果有就传递上一级的输出
+                elif len(inspect.signature(command_class.execute).parameters) == 1:
                     command_class.execute(input_lines=input_lines)
                 else:
                     command_class.execute()
+                return command_class.status
             except Exception as e:
-                print(f"Error executing command '{type}': {e}")
+                print(f"Error executing command '{node.name}': {e}")
+                return 1
+        elif input_lines is not None:
+            # 管道的最后一级是外部命令时，把上一级的输出写入其标准输入
+            process = self._spawn(node.text, input_lines)
+            while process.poll() is None:
+                try:
+                    process.wait(timeout=POLL_INTERVAL)
+                except subprocess.TimeoutExpired:
+                    continue
+            return process.returncode
         else:
-            # 如果命令不是我们定义的，则直接执行 shell 命令
-            os.system(cmd)
-        
-        # 恢复标准输出
-        if not last:
-            output = app._output.stdout
-            app._output = original_stdout
-            lines = output.getvalue().split('\n')
-            ansi_escape = re.compile(r'\x1b(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])') 
-            lines = [ansi_escape.sub('', line.replace("?[", "\x1b[")) for line in lines] # 修复ansi转义显示问题
-            lines = [line for line in lines if line.strip()] # 去除空行
-            return lines
-        return None  # 最后一条命令不返回任何流，因为它的输出直接打印到标准输出
\ No newline at end of file
+            # 如果命令不是我们定义的，则直接交给系统 shell 执行
+            return subprocess.call(node.text, shell=True)
+
+    def _redirect(self, node, input_lines):
+        """
+        处理内置命令的重定向（外部命令的重定向由系统 shell 处理）。
+
+        :return: (输入行迭代器, 输出重定向)，< 重定向会替换上一级命令的输入，多个输出重定向时最后一个生效。
+        """
+        output = None
+        for redirect in node.redirects:
+            if redirect.op == '<':
+                path = Command.normabs(redirect.target)
+                if not os.path.isfile(path):
+                    raise FileNotFoundError(f"'{redirect.target}' does not exist or is not a file")
+                input_lines = self._read_lines(path)
+            else:
+                output = redirect
+        return input_lines, output
+
+    @staticmethod
+    def _read_lines(path):
+        with open(path, 'r', encoding='utf-8', errors='replace', buffering=IO_BUFFER_SIZE) as f:
+            for line in f:
+                yield line.rstrip('\n')
+
+    @staticmethod
+    def _write_output(command, input_lines, redirect):
+        """
+        以纯文本的形式把命令输出写入文件，不经过终端渲染。
+        """
+        mode = 'a' if redirect.op == '>>' else 'w'
+        with open(Command.normabs(redirect.target), mode, encoding='utf-8', buffering=IO_BUFFER_SIZE) as f:
+            command.write_output(f, input_lines=input_lines)
+
+    def _spawn(self, cmd, input_lines=None, stdout=None):
+        """
+        启动外部命令；有输入时由单独的线程把输入逐行写入其标准输入。
+        """
+        stdin = subprocess.PIPE if input_lines is not None else None
+        process = subprocess.Popen(cmd, shell=True, stdin=stdin, stdout=stdout, text=True, errors='replace')
+        self._processes.append(process)
+        if input_lines is not None:
+            threading.Thread(target=self._feed, args=(process, input_lines), daemon=True).start()
+        return process
+
+    @staticmethod
+    def _feed(process, input_lines):
+        try:
+            for line in input_lines:
+                process.stdin.write(line + '\n')
+        except OSError:
+            pass    # 外部命令已经退出，不再需要输入
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
@@ -1,11 +1,19 @@
-from typing import List
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
 from prompt_toolkit import HTML, print_formatted_text as print
 from prompt_toolkit.styles import Style
 from prompt_toolkit import HTML
-from functools import wraps
+from functools import lru_cache, wraps
+import argparse
+import inspect
 import os
 import re
 import glob
+from cmds.core.pipeline import stage_flusher
+from cmds.core.syntax import ShellSyntaxError, split_words
+from cmds.core.terminal import TerminalWriter, write_fragments
+
+# 一行输出：纯文本字符串，或 prompt_toolkit 的 (样式, 文本) 片段列表
+Line = Union[str, List[Tuple[str, str]]]
 
 class Command:
     name: List[str] = None
@@ -15,52 +23,83 @@ class Command:
         'error': 'fg:ansired',
         'critical': 'fg:ansiwhite bg:ansired',
     })
+    output_style: Style = log_style     # 渲染 run() 产出的片段时使用的样式
+    styled: bool = True                 # 输出是否会渲染到终端，管道中间的命令为 False
+    status: int = 0                     # 退出状态，0 表示成功，供 && 和 || 判断
+    writer: Optional[TerminalWriter] = None  # execute() 期间合并输出的终端写入器
     
-    def __init__(self, command: str='') -> 'Command':
+    def __init__(self, command: Union[str, Tuple[str, ...]]='') -> None:
         """
-        从字符串解析命令并返回 Command 实例。
+        从字符串解析命令并初始化 Command 实例。
 
-        :param command: 包含命令选项和参数的字符串
-        :return: Command 实例
+        :param command: 包含命令选项和参数的字符串，或已经由命令行语法树拆分好的参数元组
         """
-        # 将字符串拆分成列表，类似于命令行参数
-        self.normabs = lambda x: os.path.normpath(os.path.abspath(x.replace('~', os.path.expanduser('~'))))
-        args = self.split_command(command)
         self.parse_error = False
-        if not hasattr(self, 'parser'):
+        self.status = 0
+        self.parser = type(self).get_parser()
+        if self.parser is None:
             return
-        self.parser.add_argument("--help", action="store_true", help="Show this help message and exit")
         try:
-            parsed_args = self.parser.parse_args(args)  # 解析命令参数
+            parsed_args = type(self).parse_command(command)  # 解析命令参数
         except SystemExit:
             self.parse_error = True
-            return None
-        for key, value in vars(parsed_args).items():
-            setattr(self, key, value)  # 将解析结果添加到实例属性中
-        
-        return self
+            return
+        except ShellSyntaxError as e:
+            # 参数字符串本身无法拆分（例如引号不成对），与参数错误一样只提示，不向调用者抛出
+            self.log(f"Syntax error: {e}")
+            self.parse_error = True
+            return
+        for key, value in parsed_args.items():
+            # 将解析结果添加到实例属性中，列表复制一份，避免修改缓存中的结果
+            setattr(self, key, list(value) if isinstance(value, list) else value)
+
+    @classmethod
+    def build_parser(cls) -> Optional[argparse.ArgumentParser]:
+        """
+        构建命令的参数解析器，子类重写此方法。每个命令类只会调用一次。
+
+        :return: 参数解析器，命令没有参数时返回 None。
+        """
+        return None
+
+    @classmethod
+    def get_parser(cls) -> Optional[argparse.ArgumentParser]:
+        """
+        返回命令类共享的参数解析器，第一次调用时构建。
+        """
+        if '_parser' not in cls.__dict__:
+            parser = cls.build_parser()
+            if parser is not None:
+                parser.add_argument("--help", action="store_true", help="Show this help message and exit")
+            cls._parser = parser
+        return cls._parser
+
+    @classmethod
+    def parse_command(cls, command: Union[str, Tuple[str, ...]]) -> Dict[str, Any]:
+        """
+        解析参数字符串，相同的参数字符串只会解析一次（例如从历史记录重复执行的命令）。
+
+        :param command: 包含命令选项和参数的字符串，或拆分好的参数元组。
+        :return: {参数名: 值}，调用方不应修改其中的值。
+        """
+        return _parse_command(cls, command)
+
+    @staticmethod
+    def normabs(path: str) -> str:
+        """
+        展开 ~ 并返回规范化的绝对路径。
+        """
+        return os.path.normpath(os.path.abspath(path.replace('~', os.path.expanduser('~'))))
     
-    def split_command(self, command: str) -> List[str]:
+    @staticmethod
+    def split_command(command: str) -> List[str]:
         """
         按空格分割参数，当参数有引号时，不保留引号，引号内空格不会分割。
 
         :param args: 参数字符串。
         :return: 参数列表。
         """
-        args = []
-        current_arg = ''
-        in_quotes = False
-        for char in command:
-            if char in ['"', "'"]:
-                in_quotes = not in_quotes
-            elif char == ' ' and not in_quotes:
-                args.append(current_arg)
-                current_arg = ''
-            else:
-                current_arg += char
-        if current_arg:
-            args.append(current_arg)
-        return args
+        return split_words(command)
 
     def get_file_list(self, path: str, traverse: bool = True, recursive: bool = False, include_dirs: bool = True) -> List[str]:
         """
@@ -112,9 +151,27 @@ class Command:
         :param func: 要执行的函数。
         :return: 装饰后的函数。
         """
+        if inspect.isgeneratorfunction(func):
+            # 生成器版本（用于 stream），异常同样只打印而不向管道外抛出
+            @wraps(func)
+            def gen_wrapper(self, *args, **kwargs):
+                if self.parse_error:
+                    self.status = 2
+                    return
+                if self.help:
+                    self.parser.print_help()
+                    return
+                try:
+                    yield from func(self, *args, **kwargs)
+                except Exception as e:
+                    self.status = 1
+                    print(HTML(f'<error>Error: {e}</error>'), style=Command.log_style)
+            return gen_wrapper
+
         @wraps(func)
         def wrapper(self, *args, **kwargs):
             if self.parse_error:
+                self.status = 2
                 return None
             if self.help:
                 self.parser.print_help()
@@ -122,10 +179,88 @@ class Command:
             try:
                 return func(self, *args, **kwargs)
             except Exception as e:
+                self.status = 1
                 print(HTML(f'<error>Error: {e}</error>'), style=Command.log_style)  # 假设HTML是某种日志格式
                 return None
         return wrapper
 
-        
-    def execute(self):
-        raise NotImplementedError("Subclasses should implement this!")
\ No newline at end of file
+    def run(self, input_lines: Iterable[str] = None) -> Iterator[Line]:
+        """
+        逐行产出命令的输出。每一行可以是纯文本，也可以是带样式的片段列表，
+        样式只在最后输出到终端时才会被渲染；self.styled 为 False 时可以直接产出纯文本。
+        错误等提示信息不属于输出，直接打印到终端。
+
+        :param input_lines: 上一级命令产出的行迭代器，没有则为 None。
+        :return: 输出行的迭代器。
+        """
+        raise NotImplementedError("Subclasses should implement run() or execute()!")
+
+    @staticmethod
+    def plain_text(line: Line) -> str:
+        """
+        去掉样式，返回一行输出的纯文本。
+        """
+        if isinstance(line, str):
+            return line
+        return ''.join(fragment[1] for fragment in line)
+
+    def log(self, message: str, level: str = 'error'):
+        """
+        打印一条提示信息。先刷新尚未输出的行，保证提示与输出的先后顺序一致。
+
+        :param message: 提示信息（纯文本，不解析 HTML 标签）。
+        :param level: 提示级别，对应 log_style 中的样式：success、warning、error 或 critical。
+        """
+        if self.writer is not None:
+            self.writer.flush()
+        write_fragments([(f'class:{level}', message), ('', '\n')], self.log_style)
+
+    # 类体中的 safe_exec 还是 staticmethod 对象，Python 3.10 之前不能直接调用，取出其中的函数
+    @safe_exec.__func__
+    def execute(self, input_lines: Iterable[str] = None):
+        self.styled = True
+        self.writer = TerminalWriter(self.output_style)
+        try:
+            with stage_flusher(self.writer.flush):
+                for line in self.run(input_lines):
+                    self.writer.write(line)
+        finally:
+            self.writer.flush()
+            self.writer = None
+
+    def stream(self, input_lines: Iterable[str] = None) -> Iterator[str]:
+        """
+        以惰性迭代器的形式逐行产出命令输出（纯文本，不含换行符），供管道的下一级命令消费。
+        没有实现 run() 的命令只执行 execute()，提示信息直接打印到终端，不产出任何行。
+
+        :param input_lines: 上一级命令产出的行迭代器，没有则为 None。
+        :return: 输出行的迭代器。
+        """
+        if type(self).run is Command.run:
+            self.execute()
+            return iter(())
+        return self._stream(input_lines)
+
+    def write_output(self, f: TextIO, input_lines: Iterable[str] = None):
+        """
+        以纯文本的形式把命令输出写入文件（重定向 > 和 >>），不经过终端渲染。
+
+        :param f: 以文本模式打开的目标文件。
+        :param input_lines: 上一级命令产出的行迭代器，没有则为 None。
+        """
+        f.writelines(f"{line}\n" for line in self.stream(input_lines))
+
+    @safe_exec.__func__
+    def _stream(self, input_lines: Iterable[str] = None) -> Iterator[str]:
+        self.styled = False
+        for line in self.run(input_lines):
+            yield self.plain_text(line)
+
+
+@lru_cache(maxsize=256)
+def _parse_command(command_class: type, command: Union[str, Tuple[str, ...]]) -> Dict[str, Any]:
+    """
+    按 (命令类, 参数) 缓存的解析结果；解析失败时抛出 SystemExit 或 ShellSyntaxError，失败结果不会被缓存。
+    """
+    args = list(command) if isinstance(command, tuple) else command_class.split_command(command)
+    return vars(command_class.get_parser().parse_args(args))
@@ -1,56 +1,171 @@
 import argparse
+import io
 import os
-from prompt_toolkit import HTML, print_formatted_text as print
+import shutil
+import sys
+from typing import BinaryIO, Iterator, List, TextIO
 from cmds.base import Command
-import html
+
+COPY_BLOCK_SIZE = 1 << 20   # 原样复制文件时每次传输的字节数
+
 
 class CatCommand(Command):
 
-    def __init__(self, command: str) -> 'CatCommand':
+    @classmethod
+    def build_parser(cls) -> argparse.ArgumentParser:
         """
-        解析 cat 命令并返回 CatCommand 实例。
+        构建 cat 命令的参数解析器。
         """
         parser = argparse.ArgumentParser(description="Concatenate and display file content.", add_help=False)
         parser.add_argument("-n", "--number", action="store_true", help="Number all output lines")
         parser.add_argument("-b", "--number-nonblank", action="store_true", help="Number only non-blank output lines")
         parser.add_argument("-E", "--show-ends", action="store_true", help="Display $ at the end of each line")
         parser.add_argument("files", nargs="*", type=str, help="Files to concatenate and display")
-        
-        self.parser = parser
-        super().__init__(command)
+        return parser
+
+    @property
+    def passthrough(self) -> bool:
+        """
+        是否可以原样复制文件：指定了文件且没有任何格式化选项。
+        """
+        return bool(self.files) and not (self.number or self.number_nonblank or self.show_ends)
 
     @Command.safe_exec
-    def execute(self):
+    def execute(self, input_lines=None):
+        stdout = getattr(sys.stdout, 'buffer', None)
+        if not self.passthrough or stdout is None:
+            return super().execute(input_lines)
+        # 输出到终端时同样直接写入文件的原始字节，不逐行渲染
+        sys.stdout.flush()
+        self._concatenate(stdout)
+
+    def write_output(self, f: TextIO, input_lines=None):
+        if self.parse_error or self.help or not self.passthrough:
+            return super().write_output(f, input_lines)
+        f.flush()
+        self._concatenate(f.buffer)
+
+    def run(self, input_lines=None):
+        if input_lines is not None and not self.files:
+            # 管道中没有指定文件时，直接转发上一级命令的输出
+            yield from self._format_lines(input_lines)
+            return
+
         if not self.files:
-            print(HTML("<error>Error: No files specified.</error>"), style=self.log_style)
+            self.log("Error: No files specified.")
             return
 
+        # 多个文件的行号连续编号
+        yield from self._format_lines(self._read_files(self._expand_files()))
+
+    def _expand_files(self) -> List[str]:
+        """
+        展开参数中的目录和通配符，得到要连接的文件列表。
+        """
+        paths = []
         for file_path in self.files:
             file_path = self.normabs(file_path)
-            
-            # 检查文件是否存在
-            if not os.path.isfile(file_path):
-                print(HTML(f"<error>Error: File '{file_path}' does not exist or is not a file.</error>"), style=self.log_style)
-                continue
+            file_lists = self.get_file_list(file_path, include_dirs=False)
+            if not file_lists:
+                self.status = 1
+                self.log(f"Error: File '{file_path}' does not exist or is not a file.")
+            paths.extend(file_lists)
+        return paths
 
+    def _concatenate(self, out: BinaryIO):
+        """
+        把文件的原始字节依次写入 out，不解码也不分行。
+        """
+        for path in self._expand_files():
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
-
-                line_number = 1
-                for line in lines:
-                    if self.number or (self.number_nonblank and line.strip()):
-                        line_prefix = f"{line_number:6}  "  # 右对齐的行号格式
-                        line_number += 1
-                    else:
-                        line_prefix = ""
-
-                    line_content = line.rstrip("\n") + ("$" if self.show_ends else "")
-                    print(HTML(f"{line_prefix}{html.escape(line_content)}"))
-
-            except Exception as e:
-                print(HTML(f"<critical>Critical Error: Failed to read file '{file_path}': {e}</critical>"), style=self.log_style)
-        
+                with open(path, 'rb') as src:
+                    self._copy(src, out)
+            except OSError as e:
+                self.status = 1
+                self.log(f"Critical Error: Failed to read file '{path}': {e}", 'critical')
+        out.flush()
+
+    @staticmethod
+    def _copy(src: BinaryIO, out: BinaryIO):
+        """
+        复制一个文件。支持 os.sendfile 时由内核直接在两个文件描述符之间传输数据，
+        否则（Windows、目标不是真实文件、以追加方式打开等）按块读写。
+        """
+        try:
+            out_fd = out.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            out_fd = None
+        if out_fd is not None and hasattr(os, 'sendfile'):
+            out.flush()
+            offset = 0
+            try:
+                while True:
+                    sent = os.sendfile(out_fd, src.fileno(), offset, COPY_BLOCK_SIZE)
+                    if sent == 0:
+                        return
+                    offset += sent
+            except OSError:
+                if offset:
+                    raise
+                # 一个字节都还没有传输时说明该组合不支持 sendfile，退回按块复制
+        shutil.copyfileobj(src, out, COPY_BLOCK_SIZE)
+
+    def _read_files(self, paths: List[str]) -> Iterator[str]:
+        """
+        依次产出各个文件的行（不含换行符）。
+        """
+        for path in paths:
+            try:
+                with open(path, 'rb') as f:
+                    yield from self._read_lines(f)
+            except OSError as e:
+                self.status = 1
+                self.log(f"Critical Error: Failed to read file '{path}': {e}", 'critical')
+
+    @staticmethod
+    def _read_lines(f: BinaryIO) -> Iterator[str]:
+        """
+        按大块读取文件，在最后一个换行处切开后整体解码、分行，避免逐行读取和解码的开销。
+        块从 8 KiB 开始逐次加倍，下游只需要开头几行时（例如 head）不会多读。
+        """
+        partial = b''
+        size = 1 << 13
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                break
+            size = min(size * 2, COPY_BLOCK_SIZE)
+            chunk = partial + chunk
+            end = chunk.rfind(b'\n') + 1
+            partial = chunk[end:]
+            if end:
+                text = chunk[:end].decode('utf-8', errors='replace')
+                if '\r' in text:
+                    text = text.replace('\r\n', '\n')
+                lines = text.split('\n')
+                lines.pop()
+                yield from lines
+        if partial:
+            yield partial.decode('utf-8', errors='replace').rstrip('\r')
+
+    def _format_lines(self, lines):
+        """
+        按 -n/-b/-E 选项格式化每一行。
+        """
+        if not (self.number or self.number_nonblank or self.show_ends):
+            yield from lines
+            return
+        line_number = 1
+        for line in lines:
+            if self.number or (self.number_nonblank and line.strip()):
+                line_prefix = f"{line_number:6}  "  # 右对齐的行号格式
+                line_number += 1
+            else:
+                line_prefix = ""
+
+            line_content = line.rstrip("\n") + ("$" if self.show_ends else "")
+            yield f"{line_prefix}{line_content}"
+
 # 示例用法
 if __name__ == "__main__":
     command = "-n history.txt"  # 示例命令
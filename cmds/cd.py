@@ -6,15 +6,14 @@ from cmds.base import Command
 
 class CdCommand(Command):
     last_path = None  # 记录上一次的路径，用于 cd - 功能
-    def __init__(self, command: str) -> 'CdCommand':
+    @classmethod
+    def build_parser(cls) -> argparse.ArgumentParser:
         """
-        解析 cd 命令并返回 CdCommand 实例。
+        构建 cd 命令的参数解析器。
         """
         parser = argparse.ArgumentParser(description="Change the current directory.", add_help=False)
         parser.add_argument("directory", nargs="*", type=str, help="Target directory to change to")     # 如果有空格的话，会拆分为不同的参数
-        
-        self.parser = parser
-        super().__init__(command)
+        return parser
 
     @Command.safe_exec
     def execute(self):
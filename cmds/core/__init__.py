@@ -0,0 +1 @@
+# 命令之外的公共组件（管道执行等），不会被当作命令加载
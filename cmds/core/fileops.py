@@ -0,0 +1,390 @@
+import errno
+import functools
+import os
+import shutil
+import stat
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union
+
+from prompt_toolkit.application.current import get_app_session
+
+from cmds.core.profile import format_bytes
+
+COPY_CHUNK_SIZE = 1 << 26       # copy_file_range / sendfile 每次调用传输的字节数
+WORKERS = min(32, (os.cpu_count() or 1) + 4)    # 文件操作主要在等待 I/O，线程数多于 CPU 核数
+PROGRESS_DELAY = 0.5            # 操作持续超过该时间（秒）才显示进度行
+PROGRESS_INTERVAL = 0.2         # 进度行的刷新间隔（秒）
+REMOVE_BATCH_SIZE = 256         # 删除目录树时每个任务删除的文件数
+# 目录联接的重解析标记，stat 模块只在 Windows 上定义该常量
+IO_REPARSE_TAG_MOUNT_POINT = getattr(stat, 'IO_REPARSE_TAG_MOUNT_POINT', 0xA0000003)
+
+T = TypeVar('T')
+
+
+class Progress:
+    """
+    并行文件操作的进度和结果：工作线程累加完成的文件数和字节数、记录每个文件的错误，
+    调用线程定期把进度刷新到终端的同一行上。很快就结束的操作不会显示进度行。
+    """
+
+    def __init__(self, action: str, total_files: Optional[int] = None):
+        """
+        :param action: 进度和总结中使用的动词，例如 "Copied"。
+        :param total_files: 文件总数，未知时为 None。
+        """
+        self.action = action
+        self.total_files = total_files
+        self.files = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.errors: List[Tuple[str, str]] = []
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.shown = False          # 进度行当前是否显示在终端上
+        self.displayed = False      # 是否显示过进度行，显示过时应在结束后输出总结
+        try:
+            self.enabled = sys.stdout.isatty()
+        except (AttributeError, ValueError):
+            self.enabled = False
+
+    def add(self, size: int = 0, files: int = 1):
+        with self.lock:
+            self.files += files
+            self.bytes += size
+
+    def skip(self):
+        with self.lock:
+            self.skipped += 1
+
+    def fail(self, path: str, error: BaseException):
+        message = error.strerror if isinstance(error, OSError) and error.strerror else str(error)
+        with self.lock:
+            self.errors.append((path, message))
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def line(self) -> str:
+        total = f"/{self.total_files}" if self.total_files is not None else ""
+        rate = self.bytes / self.elapsed if self.elapsed > 0 else 0
+        return f"{self.action} {self.files}{total} files, {format_bytes(self.bytes)} ({format_bytes(int(rate))}/s)"
+
+    def summary(self) -> str:
+        """
+        操作结束后的总结，例如 "Copied 120 files (3.2MB) in 1.52s, 2 skipped, 1 failed"。
+        """
+        text = f"{self.action} {self.files} files ({format_bytes(self.bytes)}) in {self.elapsed:.2f}s"
+        if self.skipped:
+            text += f", {self.skipped} skipped"
+        if self.errors:
+            text += f", {len(self.errors)} failed"
+        return text
+
+    def refresh(self):
+        """
+        在终端的当前行上重绘进度。
+        """
+        if not self.enabled or self.elapsed < PROGRESS_DELAY:
+            return
+        self._write(self.line())
+        self.shown = self.displayed = True
+
+    def clear(self):
+        """
+        擦除进度行，之后的输出从行首开始。
+        """
+        if self.shown:
+            self._write('')
+            self.shown = False
+
+    @staticmethod
+    def _write(text: str):
+        output = get_app_session().output
+        output.write_raw('\r')
+        output.write(text)
+        output.erase_end_of_line()
+        output.flush()
+
+
+def run_parallel(func: Callable[[T], None], items: Iterable[T], progress: Progress,
+                 path: Callable[[T], str] = str, workers: int = WORKERS):
+    """
+    在多个线程中对每一项调用 func，调用线程等待全部完成并定期刷新进度。
+    工作线程从同一个迭代器中依次取出任务，不会为每一项创建 Future，百万级的任务也只占用迭代器本身的内存。
+    func 抛出的异常记录为该项的错误，不影响其它项；Ctrl-C 时不再开始新的任务，等正在进行的任务结束后抛出。
+
+    :param func: 处理一项的函数，完成后应自行调用 progress.add()。
+    :param items: 任务。
+    :param progress: 记录进度和错误。
+    :param path: 出错时从任务得到报告的路径。
+    :param workers: 线程数。
+    """
+    iterator = iter(items)
+    lock = threading.Lock()
+    stop = threading.Event()
+    done = object()
+
+    def work():
+        while not stop.is_set():
+            with lock:
+                item = next(iterator, done)
+            if item is done:
+                return
+            try:
+                func(item)
+            except Exception as e:
+                progress.fail(path(item), e)
+
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(max(workers, 1))]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(PROGRESS_INTERVAL)
+                progress.refresh()
+    except BaseException:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        raise
+    finally:
+        progress.clear()
+
+
+def is_junction(info: os.stat_result) -> bool:
+    """
+    状态是否属于 Windows 的目录联接（junction）。os.path.islink 和 DirEntry.is_symlink 不把联接当作链接，
+    isdir 和 is_dir(follow_symlinks=False) 却把它当作目录，遍历时会进入联接，处理到目标目录中的文件。
+    判断方式与 shutil.rmtree 相同：带有重解析点属性，且重解析标记是 IO_REPARSE_TAG_MOUNT_POINT。
+    """
+    return (bool(getattr(info, 'st_file_attributes', 0) & stat.FILE_ATTRIBUTE_REPARSE_POINT)
+            and getattr(info, 'st_reparse_tag', None) == IO_REPARSE_TAG_MOUNT_POINT)
+
+
+def is_link(info: os.stat_result) -> bool:
+    """
+    状态是否属于符号链接或目录联接。
+    """
+    return stat.S_ISLNK(info.st_mode) or is_junction(info)
+
+
+def is_real_dir(entry: Union[os.DirEntry, str]) -> bool:
+    """
+    目录项或路径是否为遍历时应当进入的真实目录：指向目录的符号链接和目录联接都不算。
+    """
+    try:
+        if isinstance(entry, str):
+            info = os.lstat(entry)
+            return stat.S_ISDIR(info.st_mode) and not is_junction(info)
+        if not entry.is_dir(follow_symlinks=False):
+            return False
+        # 只有 Windows 上有联接；那里 DirEntry 的状态来自 scandir 本身，不需要额外的系统调用
+        return os.name != 'nt' or not is_junction(entry.stat(follow_symlinks=False))
+    except OSError:
+        return False
+
+
+def scan_tree(root: str, progress: Progress) -> Iterator[Tuple[str, os.DirEntry, bool]]:
+    """
+    用 os.scandir 遍历目录树，不跟随符号链接，逐项产出 (相对路径, 目录项, 是否为目录)，目录先于其中的内容产出。
+    符号链接和目录联接都不进入，作为非目录项产出。无法读取的目录记录为错误并跳过。
+    """
+    stack = ['']
+    while stack:
+        relative = stack.pop()
+        try:
+            with os.scandir(os.path.join(root, relative)) as entries:
+                for entry in entries:
+                    name = os.path.join(relative, entry.name) if relative else entry.name
+                    is_dir = is_real_dir(entry)
+                    if is_dir:
+                        stack.append(name)
+                    yield name, entry, is_dir
+        except OSError as e:
+            progress.fail(os.path.join(root, relative), e)
+
+
+def walk_tree(root: str, progress: Progress) -> Tuple[List[str], List[str]]:
+    """
+    遍历一次目录树。
+
+    :return: (目录, 文件)，都是相对于 root 的路径；目录按从上到下的顺序排列（不含 root 本身），
+             文件包括符号链接和其它非目录项。
+    """
+    dirs, files = [], []
+    for name, _, is_dir in scan_tree(root, progress):
+        (dirs if is_dir else files).append(name)
+    return dirs, files
+
+
+def stat_tree(root: str, progress: Progress) -> Tuple[List[str], Dict[str, os.stat_result]]:
+    """
+    遍历一次目录树，同时取得每个文件的状态（不跟随符号链接）。Windows 上状态来自 scandir 本身，不需要额外的系统调用。
+
+    :return: (目录, {文件: 状态})，含义同 walk_tree。
+    """
+    dirs, files = [], {}
+    for name, entry, is_dir in scan_tree(root, progress):
+        if is_dir:
+            dirs.append(name)
+            continue
+        try:
+            files[name] = entry.stat(follow_symlinks=False)
+        except OSError as e:
+            progress.fail(entry.path, e)
+    return dirs, files
+
+
+def copy_file(src: str, dst: str, preserve: bool = False, follow_symlinks: bool = True) -> int:
+    """
+    复制一个文件。follow_symlinks 为 False 时符号链接复制为链接本身，目录联接复制为指向同一目标的目录符号链接，
+    否则复制链接指向的文件。内容优先由内核复制（copy_file_range，支持时会使用 reflink
+    或服务器端复制），不支持时退回 sendfile，最后按块读写；没有 copy_file_range 的平台使用 shutil.copyfile，
+    它在 macOS 和 Windows 上会调用系统的复制接口。
+
+    :param preserve: 是否保留时间戳等属性，否则只复制权限。
+    :param follow_symlinks: 是否复制链接指向的文件。遍历目录树得到的项应当传 False。
+    :return: 复制的字节数。
+    """
+    info = os.lstat(src)
+    if not follow_symlinks and is_link(info):
+        if os.path.lexists(dst):
+            os.unlink(dst)
+        os.symlink(os.readlink(src), dst, target_is_directory=is_junction(info))
+        return 0
+    if hasattr(os, 'copy_file_range'):
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            size = os.fstat(fsrc.fileno()).st_size
+            _copy_data(fsrc, fdst, size)
+    else:
+        shutil.copyfile(src, dst)
+        size = os.stat(dst).st_size
+    if preserve:
+        shutil.copystat(src, dst)
+    else:
+        shutil.copymode(src, dst)
+    return size
+
+
+def _copy_data(fsrc, fdst, size: int):
+    """
+    在两个打开的文件之间复制全部内容。
+    """
+    in_fd, out_fd = fsrc.fileno(), fdst.fileno()
+    for transfer in (os.copy_file_range, getattr(os, 'sendfile', None)):
+        if transfer is None:
+            continue
+        copied = 0
+        try:
+            while True:
+                if transfer is os.copy_file_range:
+                    sent = transfer(in_fd, out_fd, COPY_CHUNK_SIZE)
+                else:
+                    sent = transfer(out_fd, in_fd, copied, COPY_CHUNK_SIZE)
+                if sent == 0:
+                    break
+                copied += sent
+        except OSError:
+            if copied:
+                raise
+            # 一个字节都还没有复制时说明该文件系统组合不支持，换下一种方式
+            continue
+        if copied or not size:
+            return
+        # 文件大小不为 0 却没有复制任何内容（例如 /proc 下的文件），换下一种方式
+    shutil.copyfileobj(fsrc, fdst, 1 << 20)
+
+
+def remove_file(path: str, dir_fd: Optional[int] = None) -> int:
+    """
+    删除一个文件、符号链接或目录联接（不跟随链接，联接只删除其本身）。Windows 上只读文件不能直接删除，
+    先去掉只读属性再重试。
+
+    :param dir_fd: path 是相对于该目录的名字，支持时可以省去每次解析完整路径。
+    :return: 释放的字节数，符号链接和其它非普通文件为 0。
+    """
+    info = os.lstat(path, dir_fd=dir_fd)
+    if is_junction(info):
+        os.rmdir(path, dir_fd=dir_fd)
+        return 0
+    try:
+        os.unlink(path, dir_fd=dir_fd)
+    except PermissionError:
+        if os.name != 'nt' or info.st_mode & stat.S_IWRITE:
+            raise
+        os.chmod(path, stat.S_IWRITE)
+        os.unlink(path)
+    return info.st_size if stat.S_ISREG(info.st_mode) else 0
+
+
+def remove_tree(root: str, progress: Progress, workers: int = WORKERS) -> int:
+    """
+    删除整个目录树：一边遍历一边把每个目录中的文件分批交给多个线程删除，不必等整棵树遍历完；
+    文件全部删除后再从下往上删除目录。删除的文件数和释放的字节数累加到 progress 中，
+    失败的项记录为错误，其它项照常删除。
+
+    :return: 删除的目录数（包括 root 本身）。
+    """
+    dirs = [root]
+    errors = len(progress.errors)
+
+    def batches() -> Iterator[Tuple[str, List[str]]]:
+        # 在工作线程中按需遍历，每批是同一目录中的一组文件名；遍历到的目录留到最后删除
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            names = []
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        # 目录联接和符号链接一样只删除其本身，不进入，否则会删除联接目标中的文件
+                        if is_real_dir(entry):
+                            stack.append(entry.path)
+                            dirs.append(entry.path)
+                        else:
+                            names.append(entry.name)
+            except OSError as e:
+                progress.fail(path, e)
+                continue
+            for start in range(0, len(names), REMOVE_BATCH_SIZE):
+                yield path, names[start:start + REMOVE_BATCH_SIZE]
+
+    run_parallel(functools.partial(_remove_batch, progress), batches(), progress,
+                 path=lambda batch: batch[0], workers=workers)
+
+    removed = 0
+    failed = len(progress.errors) > errors
+    # 遍历时父目录总是先于子目录加入列表，倒序即从下往上
+    for path in reversed(dirs):
+        try:
+            os.rmdir(path)
+            removed += 1
+        except OSError as e:
+            # 目录中有删除失败的文件时，目录本身不能删除是预料之中的，不重复报告
+            if not (failed and e.errno in (errno.ENOTEMPTY, errno.EEXIST)):
+                progress.fail(path, e)
+    return removed
+
+
+def _remove_batch(progress: Progress, batch: Tuple[str, List[str]]):
+    """
+    删除同一目录中的一批文件。支持 dir_fd 的平台上打开目录一次，按名字相对于它删除。
+    """
+    path, names = batch
+    dir_fd = os.open(path, os.O_RDONLY) if os.unlink in os.supports_dir_fd else None
+    size = files = 0
+    try:
+        for name in names:
+            try:
+                size += remove_file(name, dir_fd) if dir_fd is not None else remove_file(os.path.join(path, name))
+                files += 1
+            except OSError as e:
+                progress.fail(os.path.join(path, name), e)
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+        progress.add(size, files)
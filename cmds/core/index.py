@@ -0,0 +1,21 @@
+# 由 python -m cmds.core.registry 自动生成，新增或删除命令后请重新生成
+COMMANDS = {
+    'cat': ('cmds.cat', 'CatCommand'),
+    'cd': ('cmds.cd', 'CdCommand'),
+    'cp': ('cmds.cp', 'CpCommand'),
+    'grep': ('cmds.grep', 'GrepCommand'),
+    'head': ('cmds.head', 'HeadCommand'),
+    'kill': ('cmds.kill', 'KillCommand'),
+    'ls': ('cmds.ls', 'LsCommand'),
+    'mkdir': ('cmds.mkdir', 'MkdirCommand'),
+    'mv': ('cmds.mv', 'MvCommand'),
+    'ps': ('cmds.ps', 'PsCommand'),
+    'pwd': ('cmds.pwd', 'PwdCommand'),
+    'rm': ('cmds.rm', 'RmCommand'),
+    'sed': ('cmds.sed', 'SedCommand'),
+    'tail': ('cmds.tail', 'TailCommand'),
+    'tar': ('cmds.tar', 'TarCommand'),
+    'touch': ('cmds.touch', 'TouchCommand'),
+    'wc': ('cmds.wc', 'WcCommand'),
+    'wget': ('cmds.wget', 'WgetCommand'),
+}
@@ -0,0 +1,251 @@
+import itertools
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, List, Optional
+
+Producer = Callable[[Optional[Iterable[str]]], Iterator[str]]
+Consumer = Callable[[Optional[Iterable[str]]], None]
+
+POLL_INTERVAL = 0.1     # 阻塞等待时的轮询间隔（秒），保证能及时响应取消和 Ctrl-C
+FLUSH_INTERVAL = 0.05   # 批次未满时，最长等待多久就发送给下一级（秒）
+
+_stage = threading.local()  # 当前线程中运行的管道阶段的状态
+
+
+def stage_cancelled() -> bool:
+    """
+    当前线程中运行的管道阶段是否已被取消，不在管道中运行时返回 False。
+    长时间不产出输出的命令（例如 tail -f）应定期检查，以便管道结束后及时退出。
+    """
+    cancelled = getattr(_stage, 'cancelled', None)
+    return cancelled is not None and cancelled.is_set()
+
+
+def flush_stage():
+    """
+    把当前线程已经产出、但还积压在缓冲中的行立即送出，类似于 stdout.flush()：
+    管道中间的一级发送给下一级，输出到终端的命令写到终端。
+    命令在等待新的输入之前调用（例如 tail -f 等待文件增长，或上游暂时没有数据），避免已产出的行滞留。
+    """
+    flush = getattr(_stage, 'flush', None)
+    if flush is not None:
+        flush()
+
+
+@contextmanager
+def stage_flusher(flush: Callable[[], object]):
+    """
+    在当前线程中登记 flush_stage 调用的刷新函数，退出时恢复原来登记的函数。
+    """
+    previous = getattr(_stage, 'flush', None)
+    _stage.flush = flush
+    try:
+        yield
+    finally:
+        _stage.flush = previous
+
+
+class Channel:
+    """
+    连接相邻两级命令的有界队列。行按批次传递以降低加锁开销，
+    队列满时上游阻塞（背压），管道被取消时两端都会尽快返回。
+    """
+    _END = object()
+
+    def __init__(self, cancelled: threading.Event, maxsize: int = 16):
+        self.queue = queue.Queue(maxsize)
+        self.cancelled = cancelled
+        self.stopped = False    # 下游已经不再读取
+
+    def put(self, item) -> bool:
+        """
+        放入一批数据，队列满时阻塞等待。
+
+        :return: 管道已被取消或下游已不再读取时返回 False。
+        """
+        while not (self.stopped or self.cancelled.is_set()):
+            try:
+                self.queue.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def close(self):
+        """
+        通知下游输入已经结束。
+        """
+        self.put(self._END)
+
+    def stop(self):
+        """
+        下游提前结束、不再读取（例如 head 已读够行数）：上游下一次写入时即返回 False 并退出，
+        不必等到整条管道结束。
+        """
+        self.stopped = True
+        self.drain()
+
+    def drain(self):
+        """
+        丢弃队列中的数据并放入结束标记，唤醒阻塞在两端的上下游。
+        """
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            self.queue.put_nowait(self._END)
+        except queue.Full:
+            pass
+
+    def batches(self) -> Iterator[List[str]]:
+        """
+        按上游发送时的批次产出数据。
+        """
+        while True:
+            try:
+                batch = self.queue.get_nowait()
+            except queue.Empty:
+                # 上游暂时没有数据：先把本级已经产出的行送出去，再阻塞等待
+                flush_stage()
+                try:
+                    batch = self.queue.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    if self.cancelled.is_set():
+                        return
+                    continue
+            if batch is self._END:
+                return
+            yield batch
+
+    def __iter__(self) -> Iterator[str]:
+        return itertools.chain.from_iterable(self.batches())
+
+
+class ChannelLines:
+    """
+    下一级命令从 Channel 读取的行迭代器。
+    按批处理输入的命令可以通过 iter_batches 直接取得上游的批次，而不是逐行读取后重新分批。
+    """
+
+    def __init__(self, channel: Channel):
+        self.channel = channel
+        self.lines = iter(channel)
+
+    def __iter__(self) -> Iterator[str]:
+        return self.lines
+
+    def __next__(self) -> str:
+        return next(self.lines)
+
+
+def iter_batches(lines: Iterable[str], size: int) -> Iterator[List[str]]:
+    """
+    把行迭代器分成至多 size 行的列表。输入直接来自管道时沿用上游发送的批次，
+    不会为了凑满一批而等待慢速的上游（例如 tail -f），已经到达的行总能及时处理。
+    需要在读取任何一行之前调用。
+    """
+    if isinstance(lines, ChannelLines):
+        for batch in lines.channel.batches():
+            for start in range(0, len(batch), size):
+                yield batch[start:start + size]
+        return
+    lines = iter(lines)
+    while True:
+        batch = list(itertools.islice(lines, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Pipeline:
+    """
+    并发执行的管道：除最后一级外，每一级命令在独立线程中运行，
+    相邻两级通过有界的 Channel 连接；最后一级在当前线程中运行并输出到终端。
+    最后一级结束（例如 head 已读够行数）或用户按下 Ctrl-C 时，取消所有上游命令。
+    """
+
+    def __init__(self, producers: List[Producer], consumer: Consumer, queue_size: int = 16, batch_size: int = 512):
+        """
+        :param producers: 中间各级命令，接收上一级的行迭代器并返回本级输出的行迭代器。
+        :param consumer: 最后一级命令，接收上一级的行迭代器。
+        :param queue_size: 每个队列最多缓存的批次数。
+        :param batch_size: 每批最多包含的行数。
+        """
+        self.producers = producers
+        self.consumer = consumer
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.cancelled = threading.Event()
+        self.channels: List[Channel] = []
+        self.on_cancel: List[Callable[[], None]] = []   # 取消时执行的清理操作，例如结束外部命令
+
+    def run(self):
+        """
+        运行管道，返回最后一级命令的返回值。
+        """
+        workers = []
+        input_lines = None
+        try:
+            for producer in self.producers:
+                channel = Channel(self.cancelled, self.queue_size)
+                self.channels.append(channel)
+                worker = threading.Thread(target=self._pump, args=(producer, input_lines, channel), daemon=True)
+                worker.start()
+                workers.append(worker)
+                input_lines = ChannelLines(channel)
+            return self.consumer(input_lines)
+        finally:
+            self.cancel()
+            for worker in workers:
+                worker.join(timeout=POLL_INTERVAL * 10)
+
+    def cancel(self):
+        """
+        取消整条管道，上游命令会在下一次读写队列时退出。
+        """
+        self.cancelled.set()
+        for callback in self.on_cancel:
+            callback()
+        for channel in self.channels:
+            channel.drain()
+
+    def _pump(self, producer: Producer, input_lines: Optional[Iterable[str]], channel: Channel):
+        """
+        在工作线程中运行一级命令，把其输出按批次写入 channel。
+        """
+        lines = None
+        batch = []
+        deadline = time.monotonic() + FLUSH_INTERVAL
+
+        def flush() -> bool:
+            nonlocal batch, deadline
+            ok = not batch or channel.put(batch)
+            batch = []
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            return ok
+
+        _stage.cancelled = self.cancelled
+        try:
+            with stage_flusher(flush):
+                lines = producer(input_lines)
+                for line in lines:
+                    batch.append(line)
+                    if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                        if not flush():
+                            break
+                else:
+                    flush()
+        except Exception as e:
+            print(f"Error in pipe stage: {e}")
+        finally:
+            # 关闭生成器，使其中打开的文件、子进程得到清理
+            if hasattr(lines, 'close'):
+                lines.close()
+            _stage.cancelled = None
+            if isinstance(input_lines, ChannelLines):
+                input_lines.channel.stop()
+            channel.close()
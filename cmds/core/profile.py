@@ -0,0 +1,181 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+PROFILE_LIMIT = 20      # --profile 不指定文件时打印的函数条数
+
+_local = threading.local()      # 当前线程正在计时的管道阶段
+_hook_lock = threading.Lock()
+_hook_installed = False
+_MODULE_SUFFIXES = ('.py', '.pyc')
+
+
+def _audit_hook(event: str, args: tuple):
+    # 审计钩子无法移除，只在线程正在计时时才统计；导入命令模块和按文件描述符打开的不算在内
+    if event == 'open':
+        stage = getattr(_local, 'stage', None)
+        path = args[0]
+        if stage is not None and isinstance(path, str) and not path.endswith(_MODULE_SUFFIXES):
+            stage.files_opened += 1
+
+
+def _install_audit_hook():
+    """
+    第一次使用 time 时安装审计钩子，用来统计各阶段打开的文件数。
+    """
+    global _hook_installed
+    with _hook_lock:
+        if not _hook_installed:
+            sys.addaudithook(_audit_hook)
+            _hook_installed = True
+
+
+def format_bytes(size: int) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+
+
+class StageStats:
+    """
+    管道中一级命令的统计：耗时、流入流出的行数和字节数（按 UTF-8 计算，含换行符）、打开的文件数。
+    没有输入（第一级）或输出到终端（最后一级）时，对应的行数和字节数为 None。
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.lines_in: Optional[int] = None
+        self.bytes_in: Optional[int] = None
+        self.lines_out: Optional[int] = None
+        self.bytes_out: Optional[int] = None
+        self.files_opened = 0
+        self.profile: Optional[cProfile.Profile] = None
+
+
+class Profiler:
+    """
+    time 前缀的实现：包装管道中每一级命令，记录其在所在线程中的墙钟时间和 CPU 时间，
+    命令结束后打印逐级的统计。--profile 时还会用 cProfile 分析每一级，并输出 CPU 时间最长的一级。
+    """
+
+    def __init__(self, texts: List[str], options: Tuple[str, ...] = ()):
+        """
+        :param texts: 管道中各级命令的原始文本。
+        :param options: time 之后的选项：--profile 打印分析结果，--profile=FILE 把分析结果保存到文件。
+        """
+        self.stages = [StageStats(text) for text in texts]
+        self.profile = False
+        self.profile_file = None
+        for option in options:
+            self.profile = True
+            if '=' in option:
+                self.profile_file = option.split('=', 1)[1]
+        self.start_wall = time.perf_counter()
+        self.start_times = os.times()
+        _install_audit_hook()
+
+    def producer(self, index: int, producer: Callable[[Optional[Iterable[str]]], Iterator[str]]):
+        """
+        包装管道中间的一级命令，统计其输入输出。
+        """
+        stage = self.stages[index]
+
+        def run(input_lines: Optional[Iterable[str]] = None) -> Iterator[str]:
+            stage.lines_out = stage.bytes_out = 0
+            with self._measure(stage):
+                for line in producer(self._count_input(stage, input_lines)):
+                    stage.lines_out += 1
+                    stage.bytes_out += len(line.encode('utf-8', 'replace')) + 1
+                    yield line
+        return run
+
+    def consumer(self, index: int, consumer: Callable[[Optional[Iterable[str]]], int]):
+        """
+        包装管道的最后一级命令（或单独的一条命令）。
+        """
+        stage = self.stages[index]
+
+        def run(input_lines: Optional[Iterable[str]] = None) -> int:
+            with self._measure(stage):
+                return consumer(self._count_input(stage, input_lines))
+        return run
+
+    @staticmethod
+    def _count_input(stage: StageStats, input_lines: Optional[Iterable[str]]) -> Optional[Iterator[str]]:
+        if input_lines is None:
+            return None
+        stage.lines_in = stage.bytes_in = 0
+
+        def count():
+            for line in input_lines:
+                stage.lines_in += 1
+                stage.bytes_in += len(line.encode('utf-8', 'replace')) + 1
+                yield line
+        return count()
+
+    @contextmanager
+    def _measure(self, stage: StageStats):
+        """
+        在当前线程中计时一级命令。管道的每一级都在各自的线程中运行，因此 CPU 时间使用线程时间。
+        """
+        _local.stage = stage
+        profile = None
+        if self.profile:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12 起同一时刻只能有一个分析器，其余阶段不做分析
+                profile = None
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            stage.wall = time.perf_counter() - wall
+            stage.cpu = time.thread_time() - cpu
+            if profile is not None:
+                profile.disable()
+                stage.profile = profile
+            _local.stage = None
+
+    def report(self):
+        """
+        打印逐级统计和整体耗时；--profile 时输出 CPU 时间最长的一级的分析结果。
+        """
+        real = time.perf_counter() - self.start_wall
+        end_times = os.times()
+        user = (end_times.user - self.start_times.user) + (end_times.children_user - self.start_times.children_user)
+        system = (end_times.system - self.start_times.system) + (end_times.children_system - self.start_times.children_system)
+
+        fmt = lambda value, formatter=str: '-' if value is None else formatter(value)
+        rows = [("#", "command", "wall", "cpu", "lines in", "bytes in", "lines out", "bytes out", "files")]
+        for i, stage in enumerate(self.stages, 1):
+            rows.append((str(i), stage.text, f"{stage.wall:.3f}s", f"{stage.cpu:.3f}s",
+                         fmt(stage.lines_in), fmt(stage.bytes_in, format_bytes),
+                         fmt(stage.lines_out), fmt(stage.bytes_out, format_bytes), str(stage.files_opened)))
+        widths = [max(len(row[col]) for row in rows) for col in range(len(rows[0]))]
+        print()
+        for row in rows:
+            # 命令列左对齐，其余列右对齐
+            print("  ".join(cell.ljust(width) if col == 1 else cell.rjust(width)
+                            for col, (cell, width) in enumerate(zip(row, widths))))
+        print(f"real {real:.3f}s  user {user:.3f}s  sys {system:.3f}s")
+
+        profiled = [stage for stage in self.stages if stage.profile is not None]
+        if not profiled:
+            return
+        slowest = max(profiled, key=lambda stage: stage.cpu)
+        if self.profile_file:
+            slowest.profile.dump_stats(os.path.abspath(os.path.expanduser(self.profile_file)))
+            print(f"Profile of '{slowest.text}' saved to '{self.profile_file}'")
+        else:
+            print(f"\nProfile of '{slowest.text}':")
+            pstats.Stats(slowest.profile, stream=sys.stdout).sort_stats('cumulative').print_stats(PROFILE_LIMIT)
@@ -0,0 +1,100 @@
+import importlib
+import os
+from typing import Dict, Iterator, Tuple
+
+CMDS_DIR = os.path.dirname(os.path.dirname(__file__))
+INDEX_PATH = os.path.join(os.path.dirname(__file__), 'index.py')
+EXCLUDED = ['base.py', '__init__.py']
+
+
+def scan_commands(cmds_dir: str = CMDS_DIR) -> Dict[str, Tuple[str, str]]:
+    """
+    扫描 cmds 目录，返回 {命令名: (模块名, 类名)}。
+
+    :param cmds_dir: 命令模块所在目录。
+    :return: 命令索引。
+    """
+    index = {}
+    for file in sorted(os.listdir(cmds_dir)):
+        file_path = os.path.join(cmds_dir, file)
+        if os.path.isfile(file_path) and file.endswith('.py') and file not in EXCLUDED:
+            name = file[:-3]
+            index[name] = (f"cmds.{name}", f"{name.capitalize()}Command")
+    return index
+
+
+def generate_index(path: str = INDEX_PATH) -> Dict[str, Tuple[str, str]]:
+    """
+    预先生成命令索引文件，启动时直接读取索引，无需扫描目录。
+
+    :param path: 索引文件路径。
+    :return: 写入的命令索引。
+    """
+    index = scan_commands()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("# 由 python -m cmds.core.registry 自动生成，新增或删除命令后请重新生成\n")
+        f.write("COMMANDS = {\n")
+        for name, (module, class_name) in index.items():
+            f.write(f"    {name!r}: ({module!r}, {class_name!r}),\n")
+        f.write("}\n")
+    return index
+
+
+class CommandRegistry:
+    """
+    命令名到命令类的映射。命令模块只在第一次使用时才会被导入，
+    避免启动时就加载 requests、psutil 等较重的依赖。
+    """
+
+    def __init__(self, index: Dict[str, Tuple[str, str]]):
+        self.index = dict(index)
+        self.classes = {}
+
+    @classmethod
+    def load(cls) -> 'CommandRegistry':
+        """
+        优先读取预先生成的索引，没有索引时扫描目录。
+        """
+        try:
+            from cmds.core.index import COMMANDS
+        except ImportError:
+            COMMANDS = scan_commands()
+        return cls(COMMANDS)
+
+    def _lookup(self, name: str):
+        entry = self.index.get(name)
+        if entry is None and name.isidentifier() and os.path.isfile(os.path.join(CMDS_DIR, f"{name}.py")) and f"{name}.py" not in EXCLUDED:
+            # 索引生成之后新增的命令
+            entry = self.index[name] = (f"cmds.{name}", f"{name.capitalize()}Command")
+        return entry
+
+    def __contains__(self, name: str) -> bool:
+        return self._lookup(name) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def get(self, name: str):
+        """
+        返回命令类，第一次调用时导入对应模块。
+
+        :param name: 命令名，例如 'ls'。
+        :return: 命令类，例如 LsCommand。
+        """
+        if name not in self.classes:
+            entry = self._lookup(name)
+            if entry is None:
+                raise KeyError(f"Unknown command '{name}'")
+            module, class_name = entry
+            self.classes[name] = getattr(importlib.import_module(module), class_name)
+        return self.classes[name]
+
+
+registry = CommandRegistry.load()
+
+if __name__ == "__main__":
+    index = generate_index()
+    print(f"Generated {INDEX_PATH} with {len(index)} commands: {', '.join(index)}")
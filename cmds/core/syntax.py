@@ -0,0 +1,167 @@
+import re
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Tuple
+
+# 一次扫描识别出空白、引号字符串、运算符和普通字符片段
+TOKEN_PATTERN = re.compile(r'''
+    (?P<space>\s+)
+  | '(?P<single>[^']*)'
+  | "(?P<double>[^"]*)"
+  | (?P<op>&&|\|\||>>|[|;<>])
+  | (?P<bare>[^\s'"|;<>&]+|&)
+  | (?P<unclosed>['"])
+''', re.VERBOSE)
+
+CONNECTORS = (';', '&&', '||')
+REDIRECTS = ('<', '>', '>>')
+TIME_OPTION = re.compile(r'--profile(=.+)?$')   # time 前缀支持的选项
+
+
+class ShellSyntaxError(ValueError):
+    pass
+
+
+class Token(NamedTuple):
+    kind: str       # 'word' 或 'op'
+    value: str      # 去掉引号后的单词，或运算符本身
+    start: int      # 在原始命令行中的起止位置
+    end: int
+
+
+class Redirect(NamedTuple):
+    op: str         # '<'、'>' 或 '>>'
+    target: str
+
+
+class SimpleCommand(NamedTuple):
+    argv: Tuple[str, ...]
+    redirects: Tuple[Redirect, ...]
+    text: str       # 原始命令文本（含重定向），交给系统 shell 执行外部命令时使用
+
+    @property
+    def name(self) -> str:
+        return self.argv[0]
+
+    @property
+    def args(self) -> Tuple[str, ...]:
+        return self.argv[1:]
+
+
+class PipeChain(NamedTuple):
+    commands: Tuple[SimpleCommand, ...]
+    # 以 time 开头的管道为 time 之后的选项（可以为空），否则为 None
+    timed: Optional[Tuple[str, ...]] = None
+
+
+class CommandLine(NamedTuple):
+    # (连接符, 管道)，连接符为 None（第一条）、';'、'&&' 或 '||'
+    items: Tuple[Tuple[Optional[str], PipeChain], ...]
+
+
+def tokenize(line: str) -> List[Token]:
+    """
+    将命令行拆分为单词和运算符。引号内的空格和运算符不会被拆分，引号本身不保留，
+    反斜杠不做转义（Windows 路径分隔符）；相邻的引号片段和普通片段拼接为同一个单词，
+    例如 foo"bar baz" -> foobar baz。
+
+    :param line: 命令行字符串。
+    :return: Token 列表。
+    """
+    tokens = []
+    parts = []          # 当前单词的各个片段
+    word_start = None
+    for m in TOKEN_PATTERN.finditer(line):
+        kind = m.lastgroup
+        if kind == 'unclosed':
+            raise ShellSyntaxError(f"unterminated quote at position {m.start()}")
+        if kind in ('space', 'op'):
+            if word_start is not None:
+                tokens.append(Token('word', ''.join(parts), word_start, m.start()))
+                parts, word_start = [], None
+            if kind == 'op':
+                tokens.append(Token('op', m.group(), m.start(), m.end()))
+            continue
+        if word_start is None:
+            word_start = m.start()
+        parts.append(m.group(kind))
+    if word_start is not None:
+        tokens.append(Token('word', ''.join(parts), word_start, len(line)))
+    return tokens
+
+
+def split_words(line: str) -> List[str]:
+    """
+    按空格拆分参数字符串，运算符按普通字符处理。
+
+    :param line: 参数字符串。
+    :return: 参数列表。
+    """
+    words = []
+    last_end = None
+    for token in tokenize(line):
+        # 紧挨着的单词和运算符（例如 a>b）视为同一个参数
+        if words and token.start == last_end:
+            words[-1] += token.value
+        else:
+            words.append(token.value)
+        last_end = token.end
+    return words
+
+
+@lru_cache(maxsize=256)
+def parse(line: str) -> CommandLine:
+    """
+    将命令行解析为语法树：用 ;、&&、|| 连接的若干管道，每个管道由 | 连接的若干简单命令组成，
+    简单命令可以带有 <、>、>> 重定向。管道开头的 time [--profile[=FILE]] 是计时前缀，不属于第一条命令。
+    相同的命令行只会解析一次，返回的语法树不可修改。
+
+    :param line: 命令行字符串。
+    :return: CommandLine 语法树。
+    """
+    items = []
+    connector = None
+    chain = []
+    timed = None
+    argv, redirects, start = [], [], None
+    tokens = tokenize(line)
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token.kind == 'word' and not argv and not redirects and not chain and (
+                timed is None and token.value == 'time' or timed is not None and TIME_OPTION.match(token.value)):
+            timed = () if timed is None else timed + (token.value,)
+        elif token.kind == 'word':
+            argv.append(token.value)
+            start = token.start if start is None else start
+            end = token.end
+        elif token.value in REDIRECTS:
+            if i + 1 >= len(tokens) or tokens[i + 1].kind != 'word':
+                raise ShellSyntaxError(f"missing file name after '{token.value}'")
+            redirects.append(Redirect(token.value, tokens[i + 1].value))
+            start = token.start if start is None else start
+            end = tokens[i + 1].end
+            i += 1
+        else:
+            # | 或连接符，结束当前简单命令
+            if not argv:
+                raise ShellSyntaxError(f"unexpected '{token.value}'")
+            chain.append(SimpleCommand(tuple(argv), tuple(redirects), line[start:end]))
+            argv, redirects, start = [], [], None
+            if token.value in CONNECTORS:
+                items.append((connector, PipeChain(tuple(chain), timed)))
+                connector, chain, timed = token.value, [], None
+        i += 1
+
+    if argv:
+        chain.append(SimpleCommand(tuple(argv), tuple(redirects), line[start:end]))
+    elif redirects:
+        raise ShellSyntaxError("missing command before redirection")
+    elif timed is not None and not chain:
+        raise ShellSyntaxError("missing command after 'time'")
+    elif chain:
+        raise ShellSyntaxError("missing command after '|'")
+    elif connector in ('&&', '||'):
+        raise ShellSyntaxError(f"missing command after '{connector}'")
+    if chain:
+        items.append((connector, PipeChain(tuple(chain), timed)))
+    return CommandLine(tuple(items))
@@ -0,0 +1,78 @@
+import time
+from functools import lru_cache
+from typing import List, Tuple, Union
+
+from prompt_toolkit.application import get_app_or_none, run_in_terminal
+from prompt_toolkit.application.current import get_app_session
+from prompt_toolkit.renderer import print_formatted_text as render_fragments
+from prompt_toolkit.styles import BaseStyle, default_pygments_style, default_ui_style, merge_styles
+
+Fragments = List[Tuple[str, str]]
+
+MAX_PENDING_LINES = 2048    # 缓冲的行数达到该值时立即刷新
+FRAME_INTERVAL = 1 / 30     # 两次刷新之间的最长间隔（秒），保证慢速输出也能及时显示
+
+
+@lru_cache(maxsize=None)
+def merged_style(style: BaseStyle) -> BaseStyle:
+    """
+    将命令的样式与 prompt_toolkit 的默认样式合并，每个样式只合并一次。
+    print_formatted_text 每次调用都会重新合并并解析全部默认样式，逐行调用时这部分开销远大于输出本身。
+    """
+    return merge_styles([default_ui_style(), default_pygments_style(), style])
+
+
+def write_fragments(fragments: Fragments, style: BaseStyle):
+    """
+    用一次渲染把片段写到终端并刷新。
+
+    :param fragments: (样式, 文本) 片段列表，换行需包含在文本中。
+    :param style: 片段使用的样式。
+    """
+    output = get_app_session().output
+
+    def render():
+        render_fragments(output, fragments, merged_style(style), color_depth=output.get_default_color_depth())
+        output.flush()
+
+    app = get_app_or_none()
+    if app is not None and app.loop is not None:
+        # 有正在运行的界面时，与 print_formatted_text 一样打印在界面上方
+        app.loop.call_soon_threadsafe(lambda: run_in_terminal(render))
+    else:
+        render()
+
+
+class TerminalWriter:
+    """
+    合并多行输出后再写到终端：行先累积在缓冲区中，
+    攒满 MAX_PENDING_LINES 行或距上次刷新超过一帧时，以一次渲染整体输出。
+    """
+
+    def __init__(self, style: BaseStyle):
+        self.style = style
+        self.fragments: Fragments = []
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def write(self, line: Union[str, Fragments]):
+        """
+        写入一行输出（纯文本或片段列表，不含换行符）。
+        """
+        if isinstance(line, str):
+            self.fragments.append(('', line))
+        else:
+            self.fragments.extend(line)
+        self.fragments.append(('', '\n'))
+        self.pending += 1
+        if self.pending >= MAX_PENDING_LINES or time.monotonic() - self.last_flush >= FRAME_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """
+        把缓冲区中的内容写到终端。
+        """
+        if self.fragments:
+            fragments, self.fragments, self.pending = self.fragments, [], 0
+            write_fragments(fragments, self.style)
+        self.last_flush = time.monotonic()
@@ -1,14 +1,28 @@
 import argparse
+import functools
+import hashlib
+import json
 import os
 import shutil
-from prompt_toolkit import HTML, print_formatted_text as print
+import stat
+import tempfile
+from typing import Dict, List, Optional, Tuple
 from cmds.base import Command
+from cmds.core.fileops import (Progress, copy_file, is_junction, is_link, is_real_dir, remove_file, run_parallel,
+                                stat_tree, walk_tree)
+
+SYNC_MANIFEST = '.cp-sync.json'     # --sync 在目标目录根部保存的清单文件名
+HASH_BLOCK_SIZE = 1 << 20           # --checksum 计算哈希时每次读取的字节数
+
+ManifestEntry = Tuple[int, int, Optional[str]]    # (大小, 修改时间 ns, 内容哈希)
+
 
 class CpCommand(Command):
 
-    def __init__(self, command: str) -> 'CpCommand':
+    @classmethod
+    def build_parser(cls) -> argparse.ArgumentParser:
         """
-        解析 cp 命令并返回 CpCommand 实例。
+        构建 cp 命令的参数解析器。
         """
         parser = argparse.ArgumentParser(description="Copy files or directories.", add_help=False)
         parser.add_argument("-a", "--archive", action="store_true", help="Preserve attributes and copy recursively")
@@ -19,72 +33,344 @@ class CpCommand(Command):
         parser.add_argument("-p", "--preserve", action="store_true", help="Preserve file attributes")
         parser.add_argument("-f", "--force", action="store_true", help="Force copy, overwrite if necessary")
         parser.add_argument("-l", "--link", action="store_true", help="Create hard links instead of copying")
+        parser.add_argument("--sync", action="store_true",
+                            help="Make the destination directory a copy of the source directory, copying only changed files "
+                                 f"(the state of the last sync is kept in {SYNC_MANIFEST} at the destination root)")
+        parser.add_argument("--checksum", action="store_true", help="With --sync, compare file contents instead of modification times")
+        parser.add_argument("--delete", action="store_true", help="With --sync, delete destination files that do not exist in the source")
         parser.add_argument("src", type=str, help="Source file or directory")
         parser.add_argument("dst", type=str, help="Destination file or directory")
-        
-        self.parser = parser
-        super().__init__(command)
+        return parser
 
     @Command.safe_exec
     def execute(self):
-        srcs = self.get_file_list(self.src)
+        # 目录本身作为源，不展开其中的文件；通配符展开为多个源
+        srcs = self.get_file_list(self.normabs(self.src), traverse=False)
 
         # 检查源路径是否存在
         if not srcs:
-            print(HTML(f"<error>Error: Source '{self.src}' does not exist.</error>"), style=self.log_style)
+            self.log(f"Error: Source '{self.src}' does not exist.")
+            self.status = 1
+            return
+
+        dst_root = self.normabs(self.dst)
+        if self.sync:
+            if len(srcs) > 1 or not os.path.isdir(srcs[0]):
+                self.log("Error: --sync requires a single source directory.")
+                self.status = 1
+                return
+            self._sync(self.normabs(srcs[0]), dst_root)
+            return
+        if len(srcs) > 1 and not os.path.isdir(dst_root):
+            self.log(f"Error: Target '{self.dst}' is not a directory.")
+            self.status = 1
             return
 
+        # 先遍历所有源，得到要创建的目录和要复制的文件，目录在复制文件之前全部创建好
+        progress = Progress("Copied")
+        dirs: List[Tuple[str, str]] = []
+        files: List[Tuple[str, str, bool]] = []
+        copied: List[Tuple[str, str]] = []
         for src in srcs:
             src = self.normabs(src)
-            dst = self.normabs(self.dst)
-            # 如果目标是目录，拼接源文件名到目标路径
-            if os.path.isdir(dst):
-                dst = os.path.join(dst, os.path.basename(src))
-
-            # 如果目标文件已存在
-            if os.path.exists(dst):
-                if self.interactive:
-                    response = input(f"Overwrite '{dst}'? [y/N]: ").strip().lower()
-                    if response not in ['y', 'yes']:
-                        print(HTML(f"<warning>Skipped: '{dst}' not overwritten.</warning>"), style=self.log_style)
-                        return
-                elif self.update:
-                    if os.path.getmtime(src) <= os.path.getmtime(dst):
-                        print(f"Skipped: '{dst}' is up to date.")
-                        return
-                elif not self.force:
-                    print(HTML(f"<error>Error: '{dst}' already exists. Use -f to force overwrite.</error>"), style=self.log_style)
-                    return
+            dst = os.path.join(dst_root, os.path.basename(src)) if os.path.isdir(dst_root) else dst_root
+            is_dir = is_real_dir(src)
 
-            # 创建链接而非复制
-            if self.link:
-                try:
-                    os.link(src, dst)
-                    if self.verbose:
-                        print(HTML(f"<success>Linked '{src}' to '{dst}'</success>"), style=self.log_style)
-                except Exception as e:
-                    print(HTML(f"<error>Error: Failed to link '{src}' to '{dst}': {e}</error>"), style=self.log_style)
-                return
+            if is_dir and not (self.recursive or self.archive):
+                self.log(f"Error: '{src}' is a directory. Use -r or -a to copy directories.")
+                self.status = 1
+                continue
+            if is_dir and (dst == src or dst.startswith(src + os.sep)):
+                self.log(f"Error: Cannot copy '{src}' into itself.")
+                self.status = 1
+                continue
+            # 如果目标已存在，按 -i/-u/-f 决定是否覆盖，跳过的源不影响其它源
+            if os.path.lexists(dst) and not self._may_overwrite(src, dst, is_dir):
+                continue
 
-            # 执行复制操作
+            if is_dir:
+                sub_dirs, sub_files = walk_tree(src, progress)
+                dirs.append((src, dst))
+                dirs.extend((os.path.join(src, name), os.path.join(dst, name)) for name in sub_dirs)
+                files.extend((os.path.join(src, name), os.path.join(dst, name), False) for name in sub_files)
+            else:
+                # 目录树中的符号链接复制为链接本身；作为参数给出的文件链接与 GNU cp 一样复制指向的内容，
+                # 指向目录的链接和目录联接仍然复制为链接
+                files.append((src, dst, not os.path.isdir(src)))
+            copied.append((src, dst))
+
+        for src, dst in dirs:
             try:
-                if os.path.isdir(src):
-                    if not (self.recursive or self.archive):
-                        print(HTML(f"<error>Error: '{src}' is a directory. Use -r or -a to copy directories.</error>"), style=self.log_style)
-                        return
-                    shutil.copytree(src, dst, dirs_exist_ok=True)
-                else:
-                    shutil.copy2(src, dst) if self.preserve else shutil.copy(src, dst)
-
-                if self.verbose:
-                    print(HTML(f"Copied <aaa fg='ansiyellow'>'{src}'</aaa> to <aaa fg='ansigreen'>'{dst}'</aaa>"))
-
-                # 保留文件权限等属性
-                if self.archive or self.preserve:
+                os.makedirs(dst, exist_ok=True)
+            except OSError as e:
+                progress.fail(dst, e)
+
+        progress.total_files = len(files)
+        run_parallel(functools.partial(self._copy_one, progress), files, progress, path=lambda job: job[0])
+
+        if self.archive or self.preserve:
+            # 目录的时间戳在其中的文件都复制完之后再设置，从下往上
+            for src, dst in reversed(dirs):
+                try:
                     shutil.copystat(src, dst)
+                except OSError as e:
+                    progress.fail(dst, e)
 
-            except Exception as e:
-                print(HTML(f"<critical>Critical Error: Failed to copy '{src}' to '{dst}': {e}</critical>"), style=self.log_style)
+        self._report(progress, copied)
+
+    def _may_overwrite(self, src: str, dst: str, is_dir: bool) -> bool:
+        """
+        目标已经存在时，判断是否继续复制。目录会合并到已有的目录中。
+        """
+        if self.interactive:
+            response = input(f"Overwrite '{dst}'? [y/N]: ").strip().lower()
+            if response not in ['y', 'yes']:
+                self.log(f"Skipped: '{dst}' not overwritten.", 'warning')
+                return False
+        elif self.update and not is_dir:
+            if os.path.getmtime(src) <= os.path.getmtime(dst):
+                self.log(f"Skipped: '{dst}' is up to date.", 'warning')
+                return False
+        elif not (self.force or self.update):
+            self.log(f"Error: '{dst}' already exists. Use -f to force overwrite.")
+            self.status = 1
+            return False
+        return True
+
+    def _copy_one(self, progress: Progress, job: Tuple[str, str, bool]):
+        """
+        在工作线程中复制一个文件。-u 时目录树中的每个文件都单独比较修改时间。
+        """
+        src, dst, follow_symlinks = job
+        if self.update:
+            try:
+                if os.stat(src).st_mtime <= os.stat(dst).st_mtime:
+                    progress.skip()
+                    return
+            except FileNotFoundError:
+                pass
+        if self.link:
+            if os.path.lexists(dst):
+                os.unlink(dst)
+            os.link(src, dst)
+            size = 0
+        else:
+            size = copy_file(src, dst, preserve=self.archive or self.preserve, follow_symlinks=follow_symlinks)
+        progress.add(size)
+
+    def _sync(self, src: str, dst: str):
+        """
+        把 dst 同步为 src 的副本：比较整个目录树，只复制新增或改变的文件，--delete 时删除 dst 中多余的文件和目录。
+
+        文件默认按大小和修改时间判断是否改变，--checksum 时大小相同的文件再比较内容哈希。复制时保留修改时间，
+        并在 dst 根部的清单中记录每个已同步文件的大小、修改时间和哈希。再次同步时，源文件的状态与清单一致
+        且目标文件仍然存在的，不再读取目标文件的状态或计算哈希，目录树基本未变时只需要遍历一次两边的目录。
+        在同步之外直接修改目标文件不会被发现，直到对应的源文件改变。
+        """
+        if dst == src or dst.startswith(src + os.sep):
+            self.log(f"Error: Cannot sync '{src}' into itself.")
+            self.status = 1
+            return
+
+        progress = Progress("Synced")
+        manifest = self._load_manifest(src, dst)
+        src_dirs, src_files = stat_tree(src, progress)
+        src_files.pop(SYNC_MANIFEST, None)
+        if os.path.isdir(dst):
+            dst_dirs, dst_files = walk_tree(dst, progress)
+        else:
+            dst_dirs, dst_files = [], []
+        dst_file_set = set(dst_files)
+        dst_file_set.discard(SYNC_MANIFEST)
+
+        # 删除 dst 中多余的文件和目录；与源类型不同的项（源中是目录、目标中是文件）无论是否 --delete 都要先删除
+        src_dir_set = set(src_dirs)
+        deleted: List[str] = []
+        for name in dst_file_set - src_files.keys():
+            if self.delete or name in src_dir_set:
+                self._sync_remove(progress, os.path.join(dst, name), deleted)
+        if self.delete:
+            # 多余目录中的文件都已经作为多余的文件删除，从下往上删除空目录即可
+            for name in reversed(dst_dirs):
+                if name not in src_dir_set:
+                    self._sync_remove(progress, os.path.join(dst, name), deleted)
+
+        for name in [''] + src_dirs:
+            try:
+                os.makedirs(os.path.join(dst, name), exist_ok=True)
+            except OSError as e:
+                progress.fail(os.path.join(dst, name), e)
+
+        # 清单中记录的状态与源文件一致且目标文件还在的，不需要再比较；--checksum 时清单中还必须有哈希，
+        # 即上次同步已经比较过内容
+        synced: Dict[str, ManifestEntry] = {}
+        candidates = []
+        for name, info in src_files.items():
+            entry = manifest.get(name)
+            if (entry is not None and name in dst_file_set and entry[:2] == (info.st_size, info.st_mtime_ns)
+                    and (entry[2] is not None or not self.checksum or stat.S_ISLNK(info.st_mode))):
+                synced[name] = entry
+            else:
+                candidates.append(name)
+        progress.skipped = len(synced)
+
+        copied: List[str] = []
+        progress.total_files = len(candidates)
+        job = functools.partial(self._sync_one, progress, src, dst, src_files, manifest, synced, copied)
+        run_parallel(job, candidates, progress, path=lambda name: os.path.join(src, name))
+
+        if self.archive or self.preserve:
+            for name in reversed([''] + src_dirs):
+                try:
+                    shutil.copystat(os.path.join(src, name), os.path.join(dst, name))
+                except OSError as e:
+                    progress.fail(os.path.join(dst, name), e)
+
+        try:
+            self._save_manifest(src, dst, synced)
+        except OSError as e:
+            progress.fail(os.path.join(dst, SYNC_MANIFEST), e)
+
+        for path, message in progress.errors:
+            self.log(f"Error: Failed to sync '{path}': {message}")
+        if progress.errors:
+            self.status = 1
+        if self.verbose:
+            for name in sorted(copied):
+                self.log(f"Copied '{os.path.join(src, name)}' to '{os.path.join(dst, name)}'", 'success')
+            for path in sorted(deleted):
+                self.log(f"Deleted '{path}'", 'success')
+        if self.verbose or progress.displayed:
+            summary = progress.summary()
+            if deleted:
+                summary += f", {len(deleted)} deleted"
+            self.log(summary, 'success')
+
+    def _sync_one(self, progress: Progress, src_root: str, dst_root: str, src_files: Dict[str, os.stat_result],
+                  manifest: Dict[str, ManifestEntry], synced: Dict[str, ManifestEntry], copied: List[str], name: str):
+        """
+        在工作线程中比较一个文件，改变时复制，并把同步后的状态记入 synced。
+        """
+        src, dst = os.path.join(src_root, name), os.path.join(dst_root, name)
+        info = src_files[name]
+        entry = manifest.get(name)
+        digest = entry[2] if entry is not None and entry[:2] == (info.st_size, info.st_mtime_ns) else None
+        try:
+            dst_info = os.lstat(dst)
+        except FileNotFoundError:
+            dst_info = None
+        if self.checksum and digest is None and stat.S_ISREG(info.st_mode):
+            # 要复制的文件也先算出哈希记入清单，否则下次同步还要重新读取两边的内容
+            digest = self._hash_file(src)
+
+        if dst_info is not None and stat.S_ISDIR(dst_info.st_mode) and not is_junction(dst_info):
+            shutil.rmtree(dst)
+        elif dst_info is not None and self._sync_unchanged(src, dst, info, dst_info, entry, digest):
+            if self.checksum and dst_info.st_mtime_ns != info.st_mtime_ns:
+                # 内容相同只是时间不同，更新时间后下次同步可以直接比较大小和时间
+                os.utime(dst, ns=(info.st_atime_ns, info.st_mtime_ns))
+            synced[name] = (info.st_size, info.st_mtime_ns, digest)
+            progress.skip()
+            return
+        elif dst_info is not None and is_link(dst_info):
+            # 目标是链接时先删除链接本身，不能透过它写入链接指向的文件
+            remove_file(dst)
+
+        size = copy_file(src, dst, preserve=True, follow_symlinks=False)
+        synced[name] = (info.st_size, info.st_mtime_ns, digest)
+        copied.append(name)
+        progress.add(size)
+
+    def _sync_unchanged(self, src: str, dst: str, info: os.stat_result, dst_info: os.stat_result,
+                        entry: Optional[ManifestEntry], digest: Optional[str]) -> bool:
+        """
+        判断已存在的目标文件是否与源文件相同。符号链接和目录联接比较链接目标，--checksum 时比较内容哈希，
+        否则比较大小和修改时间。--checksum 时 digest 是已经算好的源文件哈希，清单中与目标文件状态一致的哈希直接使用。
+        """
+        if is_link(info) or is_link(dst_info):
+            return is_link(info) and is_link(dst_info) and os.readlink(src) == os.readlink(dst)
+        if info.st_size != dst_info.st_size:
+            return False
+        if not self.checksum:
+            return info.st_mtime_ns == dst_info.st_mtime_ns
+        if entry is not None and entry[2] is not None and entry[:2] == (dst_info.st_size, dst_info.st_mtime_ns):
+            dst_digest = entry[2]
+        else:
+            dst_digest = self._hash_file(dst)
+        return digest == dst_digest
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        """
+        计算文件内容的 BLAKE2b 哈希。hashlib 处理大块数据时会释放 GIL，多个文件可以在工作线程中同时计算。
+        """
+        digest = hashlib.blake2b()
+        buffer = bytearray(HASH_BLOCK_SIZE)
+        view = memoryview(buffer)
+        with open(path, 'rb', buffering=0) as f:
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                digest.update(view[:n])
+        return digest.hexdigest()
+
+    @staticmethod
+    def _sync_remove(progress: Progress, path: str, deleted: List[str]):
+        """
+        删除目标中多余的文件或空目录。
+        """
+        try:
+            if is_real_dir(path):
+                os.rmdir(path)
+            else:
+                os.unlink(path)
+            deleted.append(path)
+        except OSError as e:
+            progress.fail(path, e)
+
+    @staticmethod
+    def _load_manifest(src: str, dst: str) -> Dict[str, ManifestEntry]:
+        """
+        读取 dst 根部的清单。清单不存在、无法解析或记录的是另一个源目录时，当作没有清单。
+        """
+        try:
+            with open(os.path.join(dst, SYNC_MANIFEST), encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('source') != src:
+                return {}
+            return {name: tuple(entry) for name, entry in data['files'].items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return {}
+
+    @staticmethod
+    def _save_manifest(src: str, dst: str, synced: Dict[str, ManifestEntry]):
+        """
+        写入新的清单：先写临时文件再替换，同步中断时旧清单仍然完整。
+        """
+        fd, temp_path = tempfile.mkstemp(prefix=SYNC_MANIFEST, dir=dst)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'source': src, 'files': synced}, f, separators=(',', ':'))
+            os.replace(temp_path, os.path.join(dst, SYNC_MANIFEST))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _report(self, progress: Progress, copied: List[Tuple[str, str]]):
+        """
+        逐个报告失败的文件；-v 或操作持续较久时输出总结。
+        """
+        for path, message in progress.errors:
+            self.log(f"Error: Failed to copy '{path}': {message}")
+        if progress.errors:
+            self.status = 1
+        if self.verbose:
+            verb = "Linked" if self.link else "Copied"
+            for src, dst in copied:
+                self.log(f"{verb} '{src}' to '{dst}'", 'success')
+        if self.verbose or progress.displayed:
+            self.log(progress.summary(), 'success')
 
 # 示例用法
 if __name__ == "__main__":
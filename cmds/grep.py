@@ -1,90 +1,608 @@
 import argparse
+import collections
+import itertools
 import os
 import re
-from prompt_toolkit import HTML, print_formatted_text as print
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from cmds.base import Command
+from cmds.core.pipeline import iter_batches
+
+CHUNK_SIZE = 1 << 20    # 每次从文件读取的字节数
+SKIP_DIRS = {'.git', '.hg', '.svn'}     # -r 时默认跳过的目录
+SERIAL_LIMIT = 64       # -r 找到的文件不超过该数量（或只有一个 CPU）时直接在当前线程中搜索，不使用线程池
+BATCH_SIZE = 32         # 每个任务包含的文件数
+AHO_CORASICK_MIN = 64   # -F 的字符串至少有这么多个时才使用 Aho–Corasick 自动机，较少时前缀树正则更快
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    返回 grep -r 共享的线程池，第一次使用时创建，之后的搜索复用同一组线程。
+    使用线程而不是进程：Windows 上的工作进程要重新导入 main.py，启动很慢；
+    作为管道中的一级运行时当前进程已有多个线程，POSIX 上 fork 出的工作进程也不安全。
+    读取文件时会释放 GIL，多个线程的读取可以与匹配重叠。
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix='grep')
+        return _executor
+
+
+def _search_batch(command, files, matcher):
+    """
+    在工作线程中搜索一批文件，返回 ('line', 输出行) 或 ('error', 错误信息) 的列表。
+    """
+    return list(command._search_files(files, matcher))
+
+
+class RegexMatcher:
+    """
+    正则表达式匹配，多个表达式或字符串合并为一个正则表达式。
+    各匹配器都提供 search(line)（返回值按真假判断）和 spans(line)（返回 (起, 止) 列表）。
+    """
+    prefilter = False   # 正则表达式可能含有 ^、$ 等锚点，不能在整块文本上预先筛选
+
+    def __init__(self, pattern: re.Pattern):
+        self.pattern = pattern
+        self.search = pattern.search    # 直接使用正则对象的方法，返回值只按真假判断
+
+    def spans(self, line: str):
+        # 先用 search 找到第一处匹配，再从其后继续 finditer，整行只扫描一遍；不匹配的行只需一次 search
+        first = self.search(line)
+        if first is None:
+            return []
+        start, end = first.span()
+        spans = [(start, end)]
+        spans.extend(m.span() for m in self.pattern.finditer(line, end if end > start else end + 1))
+        return spans
+
+
+class LiteralMatcher:
+    """
+    单个固定字符串（-F），直接使用字符串查找，不经过正则引擎。
+    """
+    prefilter = True    # 固定字符串不跨行，整块文本中找不到时其中每一行都不会匹配
+
+    def __init__(self, needle: str, ignore_case: bool = False):
+        self.ignore_case = ignore_case
+        self.needle = needle.lower() if ignore_case else needle
+
+    def search(self, line: str) -> bool:
+        return self.needle in (line.lower() if self.ignore_case else line)
+
+    def spans(self, line: str):
+        text = line.lower() if self.ignore_case else line
+        spans = []
+        start = text.find(self.needle)
+        while start >= 0:
+            spans.append((start, start + len(self.needle)))
+            start = text.find(self.needle, start + len(self.needle))
+        return spans
+
+
+class AhoCorasickMatcher:
+    """
+    多个固定字符串（-F -f FILE），用 Aho–Corasick 自动机一次扫描匹配全部字符串。
+    需要可选依赖 pyahocorasick，没有安装时改用 RegexMatcher。
+    """
+    prefilter = True
+
+    def __init__(self, needles, ignore_case: bool = False, word: bool = False):
+        import ahocorasick
+        self.ignore_case = ignore_case
+        self.word = word
+        self.automaton = ahocorasick.Automaton()
+        for needle in needles:
+            needle = needle.lower() if ignore_case else needle
+            self.automaton.add_word(needle, len(needle))
+        self.automaton.make_automaton()
+
+    def search(self, line: str) -> bool:
+        if self.word:
+            return bool(self.spans(line))
+        text = line.lower() if self.ignore_case else line
+        return next(self.automaton.iter(text), None) is not None
+
+    def spans(self, line: str):
+        text = line.lower() if self.ignore_case else line
+        matches = sorted(((end - length + 1, end + 1) for end, length in self.automaton.iter(text)),
+                         key=lambda span: (span[0], -span[1]))
+        spans = []
+        last_end = 0
+        # 与正则表达式一样，从左到右取最长的、互不重叠的匹配
+        for start, end in matches:
+            if start < last_end:
+                continue
+            if self.word and not _word_boundary(text, start, end):
+                continue
+            last_end = end
+            spans.append((start, end))
+        return spans
+
+
+def _word_boundary(text: str, start: int, end: int) -> bool:
+    """
+    判断 text[start:end] 前后是否都不是单词字符（-w）。
+    """
+    is_word = lambda ch: ch.isalnum() or ch == '_'
+    return (start == 0 or not is_word(text[start - 1])) and (end == len(text) or not is_word(text[end]))
+
+
+def _literal_union(words) -> str:
+    """
+    把多个固定字符串合并为一个前缀树形式的正则表达式，例如 foo、foobar、fob -> fo(?:o(?:bar)?|b)。
+    与简单地用 | 连接相比，正则引擎在每个位置只需沿着一条分支尝试，字符串很多时快得多。
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def build(node):
+        leaves, branches = [], []
+        for ch in sorted(key for key in node if key):
+            child = build(node[ch])
+            if child:
+                branches.append(re.escape(ch) + child)
+            else:
+                leaves.append(re.escape(ch))
+        if len(leaves) > 1:
+            branches.append(f"[{''.join(leaves)}]")
+        else:
+            branches.extend(leaves)
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{body})?" if '' in node else body
+
+    return build(trie)
+
 
 class GrepCommand(Command):
-    def __init__(self, command: str) -> 'GrepCommand':
+    pipe: bool = False  # 是否从管道读取输入
+
+    @classmethod
+    def build_parser(cls) -> argparse.ArgumentParser:
         """
-        解析 grep 命令并返回 GrepCommand 实例。
+        构建 grep 命令的参数解析器。
         """
         parser = argparse.ArgumentParser(description="Search for PATTERN in each FILE.", add_help=False)
         parser.add_argument("-i", "--ignore-case", action="store_true", help="Ignore case distinctions in patterns and data")
         parser.add_argument("-v", "--invert-match", action="store_true", help="Select non-matching lines")
         parser.add_argument("-n", "--line-number", action="store_true", help="Prefix each line of output with the line number")
-        parser.add_argument("-e", "--regexp", type=str, help="PATTERN to search for")
+        parser.add_argument("-e", "--regexp", type=str, action="append", help="PATTERN to search for (can be repeated)")
+        parser.add_argument("-f", "--file", type=str, dest="pattern_file", help="Read patterns from FILE, one per line")
+        parser.add_argument("-F", "--fixed-strings", action="store_true", help="Interpret patterns as fixed strings, not regular expressions")
+        parser.add_argument("-w", "--word-regexp", action="store_true", help="Match only whole words")
+        parser.add_argument("-r", "--recursive", action="store_true", help="Search directories recursively")
+        parser.add_argument("-a", "--text", action="store_true", help="Process binary files as if they were text")
+        parser.add_argument("-c", "--count", action="store_true", help="Print only a count of selected lines per file")
+        parser.add_argument("-l", "--files-with-matches", action="store_true", help="Print only names of files with selected lines")
+        parser.add_argument("-L", "--files-without-match", action="store_true", help="Print only names of files with no selected lines")
+        parser.add_argument("-q", "--quiet", "--silent", action="store_true", help="Suppress all output; exit with zero status if any line is selected")
+        parser.add_argument("-m", "--max-count", type=int, help="Stop reading a file after NUM selected lines")
+        parser.add_argument("-A", "--after-context", type=int, help="Print NUM lines of trailing context")
+        parser.add_argument("-B", "--before-context", type=int, help="Print NUM lines of leading context")
+        parser.add_argument("-C", "--context", type=int, help="Print NUM lines of output context")
         parser.add_argument("files", nargs="*", type=str, help="Files to search")
-        
-        self.parser = parser
-        self.pipe = False
-        super().__init__(command)
-
-    @Command.safe_exec
-    def execute(self, input_lines=None):
-        if input_lines:
-            if not self.files:
-                print(HTML("<error>Error: No expression specified.</error>"), style=self.log_style)
-                return
-            self.regexp = self.files[0]
-            self.files = []
-            self.pipe = True
+        return parser
+
+    def run(self, input_lines=None):
+        # 退出状态与 GNU grep 一致：有选中的行为 0，没有为 1，出错为 2（-q 时只要有选中的行就为 0）
+        self.matched = False
+        self.failed = False
         try:
-            # 编译正则表达式，支持忽略大小写选项 dpf def
-            pattern = re.compile(self.regexp, re.IGNORECASE if self.ignore_case else 0)
-        except re.error as e:
-            print(HTML(f"<error>Error: Invalid regular expression '{self.regexp}': {e}</error>"), style=self.log_style)
+            yield from self._run(input_lines)
+        finally:
+            if self.failed and not (self.quiet and self.matched):
+                self.status = 2
+            else:
+                self.status = 0 if self.matched else 1
+
+    def _run(self, input_lines):
+        patterns = self._read_patterns()
+        if patterns is None:
+            self.failed = True
+            return
+        matcher = self._build_matcher(patterns)
+        if matcher is None:
+            self.failed = True
             return
 
-        if input_lines:
-            ansi_escape = re.compile(r'\x1b(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')  # 用于清除 ANSI 转义序列
-            lines = [ansi_escape.sub('', line)+'\n' for line in input_lines]
-            self._process_lines(lines, pattern)
+        # 只统计或列出文件名时不需要上下文，也不需要高亮；需要高亮时在选择行的同时取得匹配位置，每行只匹配一次
+        listing = self.count or self.quiet or self.files_with_matches or self.files_without_match
+        context = lambda value: 0 if listing else max(value if value is not None else self.context or 0, 0)
+        self.after_lines = context(self.after_context)
+        self.before_lines = context(self.before_context)
+        self.highlight = self.styled and not self.invert_match and not listing
+
+        self.pipe = input_lines is not None and not self.files
+        if self.pipe:
+            results = self._report(None, self._scan_lines(input_lines, matcher))
+        elif not self.files:
+            self.log("Error: No files specified.")
+            self.failed = True
+            return
+        elif self.recursive:
+            results = self._search_tree(matcher)
         else:
+            results = self._search_files(self._expand_files(), matcher, always_header=True)
+
+        for kind, value in results:
+            if kind == 'line':
+                yield value
+            elif kind == 'lines':
+                yield from value
+            elif kind == 'matched':
+                self.matched = True
+                if self.quiet:
+                    return  # -q 只关心有没有选中的行，找到第一行即可结束
+            else:
+                self.failed = True
+                self.log(value, kind)
+
+    def _read_patterns(self):
+        """
+        收集 -e 和 -f 指定的表达式；两者都没有时，第一个位置参数即为表达式。
+
+        :return: 表达式列表，出错时返回 None。
+        """
+        patterns = list(self.regexp or [])
+        if self.pattern_file is not None:
+            try:
+                with open(self.normabs(self.pattern_file), 'r', encoding='utf-8') as f:
+                    patterns.extend(line.rstrip('\r\n') for line in f)
+            except OSError as e:
+                self.log(f"Error: Failed to read patterns from '{self.pattern_file}': {e}")
+                return None
+        elif not patterns:
             if not self.files:
-                print(HTML("<error>Error: No files specified.</error>"), style=self.log_style)
+                self.log("Error: No expression specified.")
+                return None
+            patterns.append(self.files.pop(0))
+        return patterns
+
+    def _build_matcher(self, patterns):
+        """
+        根据选项选择匹配方式：单个固定字符串直接查找，大量固定字符串优先使用 Aho–Corasick 自动机，
+        其余情况合并为一个正则表达式（固定字符串合并为前缀树形式）。
+
+        :return: 匹配器，表达式无效时返回 None。
+        """
+        if self.fixed_strings and patterns and '' not in patterns:
+            if len(patterns) == 1 and not self.word_regexp:
+                return LiteralMatcher(patterns[0], self.ignore_case)
+            if len(patterns) >= AHO_CORASICK_MIN:
+                try:
+                    return AhoCorasickMatcher(patterns, self.ignore_case, self.word_regexp)
+                except ImportError:
+                    pass
+        if not patterns:
+            expression = '(?!)'     # 表达式文件为空时，任何行都不匹配
+        elif self.fixed_strings:
+            expression = _literal_union(patterns)
+        else:
+            expression = '|'.join(f"(?:{pattern})" for pattern in patterns)
+        if self.word_regexp:
+            expression = rf"(?<!\w)(?:{expression})(?!\w)"
+        try:
+            return RegexMatcher(re.compile(expression, re.IGNORECASE if self.ignore_case else 0))
+        except re.error as e:
+            self.log(f"Error: Invalid regular expression '{' | '.join(patterns)}': {e}")
+            return None
+
+    def _search_tree(self, matcher):
+        """
+        递归搜索 self.files 中的目录。文件较多时分批交给线程池并行搜索，
+        按提交顺序取回结果，输出顺序与逐个搜索时相同；同时在途的批次有上限，内存占用不随文件数增长。
+        """
+        files = self._walk_files()
+        head = list(itertools.islice(files, SERIAL_LIMIT + 1))
+        if len(head) <= SERIAL_LIMIT or (os.cpu_count() or 1) < 2:
+            # 文件不多或只有一个 CPU 时逐个搜索，head 之后还没有取出的文件也要搜索
+            yield from self._search_files(itertools.chain(head, files), matcher)
+            return
+
+        executor = _get_executor()
+        max_pending = 4 * (os.cpu_count() or 1)
+        batches = iter(lambda: list(itertools.islice(files, BATCH_SIZE)), [])
+        pending = collections.deque()
+        try:
+            for batch in itertools.chain([head], batches):
+                pending.append(executor.submit(_search_batch, self, batch, matcher))
+                if len(pending) >= max_pending:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            # 下游提前结束（例如 head）时，取消还没有开始的批次
+            for future in pending:
+                future.cancel()
+
+    def _walk_files(self):
+        """
+        按名称顺序遍历 self.files 中的路径，产出其中的文件，跳过 SKIP_DIRS 中的目录和指向目录的链接。
+        """
+        for path in self.files:
+            path = self.normabs(path)
+            if os.path.isfile(path):
+                yield path
+                continue
+            if not os.path.isdir(path):
+                self.failed = True
+                self.log(f"Error: File '{path}' does not exist or is not a file.")
+                continue
+            stack = [path]
+            while stack:
+                directory = stack.pop()
+                try:
+                    with os.scandir(directory) as it:
+                        entries = sorted(it, key=lambda entry: entry.name)
+                except OSError as e:
+                    self.failed = True
+                    self.log(f"Error: Cannot read directory '{directory}': {e}")
+                    continue
+                subdirs = []
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in SKIP_DIRS:
+                                subdirs.append(entry.path)
+                        elif entry.is_file():
+                            yield entry.path
+                    except OSError:
+                        continue
+                # 先处理当前目录的文件，再按名称顺序进入子目录
+                stack.extend(reversed(subdirs))
+
+    def _expand_files(self):
+        """
+        展开 self.files 中的路径（文件、目录中的文件或通配符），不存在的路径打印错误。
+        """
+        for file_path in self.files:
+            file_path = self.normabs(file_path)
+            file_lists = self.get_file_list(file_path, include_dirs=False)
+            if not file_lists:
+                self.failed = True
+                self.log(f"Error: File '{file_path}' does not exist or is not a file.")
+            yield from file_lists
+
+    def _search_files(self, files, matcher, always_header=False):
+        """
+        依次搜索若干文件。-r 时默认跳过二进制文件，并且只为有输出的文件产出文件名标题。
+
+        :param always_header: 是否为每个文件都产出文件名标题。
+        :return: ('line', 输出行)、('lines', 输出行列表)、('matched', None) 或 (错误级别, 错误信息) 的迭代器。
+        """
+        for file in files:
+            try:
+                selected = self._scan_file(file, matcher, skip_binary=self.recursive and not self.text)
+                yield from self._report(file, selected, always_header)
+            except OSError as e:
+                yield 'critical', f"Critical Error: Failed to read file '{file}': {e}"
+
+    def _report(self, name, batches, always_header=False):
+        """
+        按输出方式汇报一个文件（name 为 None 时为管道输入）中被选中的行。
+        -q、-l、-L 在找到第一行时就停止读取，-m 限制每个文件最多选中的行数，
+        二进制内容中有选中的行时只提示 "Binary file ... matches"。
+
+        :param batches: _scan_file 或 _scan_lines 产出的批次，见 _select。
+        :return: 同 _search_files。
+        """
+        if self.count or self.quiet or self.files_with_matches or self.files_without_match:
+            selected = itertools.chain.from_iterable(batches)
+            if self.max_count is not None:
+                selected = itertools.islice(selected, max(self.max_count, 0))
+            if self.count:
+                count = sum(1 for _ in selected)
+                if count:
+                    yield 'matched', None
+                yield 'line', f"{name}:{count}" if name else str(count)
+                return
+            found = next(selected, None) is not None
+            if found:
+                yield 'matched', None
+            if not self.quiet and (self.files_with_matches if found else self.files_without_match):
+                yield 'line', name or "(standard input)"
+            return
+
+        header = [('bg:ansiblue', f"{name}:")] if name is not None else None
+        if header and always_header:
+            yield 'line', header
+        if self.before_lines or self.after_lines or self.max_count is not None:
+            yield from self._report_context(name, itertools.chain.from_iterable(batches), header and not always_header)
+            return
+
+        # 没有上下文和 -m 时按批次格式化输出
+        plain = not self.styled and not self.line_number
+        found = False
+        for batch in batches:
+            if not batch:
+                continue
+            if not found:
+                found = True
+                yield 'matched', None
+                if header and not always_header:
+                    yield 'line', header
+            if batch[0][2]:
+                yield 'line', f"Binary file {name} matches"
                 return
-            
-            for file_path in self.files:
-                file_path = self.normabs(file_path)
-                file_lists = self.get_file_list(file_path)
-                # 检查文件是否存在
-                if not file_lists:
-                    print(HTML(f"<error>Error: File '{file_path}' does not exist or is not a file.</error>"), style=self.log_style)
+            if plain:
+                yield 'lines', [item[1] for item in batch]
+            else:
+                yield 'lines', [self._format_line(line_number, line, spans) for line_number, line, _, spans in batch]
+
+    def _report_context(self, name, selected, header):
+        """
+        逐行输出被选中的行及其上下文（-A、-B、-C），上文保存在有界的环形缓冲区中；同时处理 -m。
+
+        :param selected: 逐行的 (行号, 行, 是否为二进制内容, 匹配位置)。
+        :param header: 第一次输出之前需要产出的文件名标题，不需要时为 None。
+        """
+        found = False
+        remaining = self.max_count          # 还能选中的行数，None 表示不限
+        before = collections.deque(maxlen=self.before_lines)   # 最近的上文行
+        after = 0                           # 还需要输出的下文行数
+        last = None                         # 上一次输出的行号，不连续时输出 -- 分隔
+        context = self.before_lines or self.after_lines
+        for line_number, line, binary, spans in selected:
+            if remaining is not None and remaining <= 0 and not after:
+                break
+            if spans is None or remaining is not None and remaining <= 0:
+                # 上下文行（-m 用完之后被选中的行也只作为下文输出）
+                if after:
+                    after -= 1
+                elif self.before_lines:
+                    before.append((line_number, line))
+                    continue
+                else:
                     continue
+                spans = None
+            else:
+                if not found:
+                    found = True
+                    yield 'matched', None
+                    if header:
+                        yield 'line', header
+                if binary:
+                    yield 'line', f"Binary file {name} matches"
+                    return
+                if remaining is not None:
+                    remaining -= 1
+                after = self.after_lines
+            for context_number, context_line in itertools.chain(before, [(line_number, line)]):
+                if context and last is not None and context_number > last + 1:
+                    yield 'line', "--"
+                last = context_number
+                yield 'line', self._format_line(context_number, context_line, spans if context_number == line_number else None)
+            before.clear()
 
-                for file in file_lists:
-                    print(HTML(f"<aaa bg='ansiblue'>{file}:</aaa>"))
-                    try:
-                        with open(file, 'r', encoding='utf-8') as f:
-                            lines = f.readlines()
-                            self._process_lines(lines, pattern)
-                    except Exception as e:
-                        print(HTML(f"<critical>Critical Error: Failed to read file '{file}': {e}</critical>"), style=self.log_style)
-                        
-    def _process_lines(self, lines, pattern):
-        """
-        处理输入的行，根据正则表达式匹配并输出结果。
-        """
-        for line_number, line in enumerate(lines, start=1):
-            match = bool(pattern.search(line))  # 检查是否匹配
-            if self.invert_match:
-                match = not match  # 反转匹配结果
-
-            if match:
-                prefix = f"{line_number:6}  " if self.line_number else ""
-                if self.invert_match:
-                    print(f"{prefix}{line.rstrip()}")
+    def _scan_file(self, file, matcher, skip_binary=False):
+        """
+        分块读取文件，逐块产出被选中的行，内存占用与文件大小无关。
+        与 GNU grep 一样，遇到 NUL 字节或无法按 UTF-8 解码的内容后，之后的内容都视为二进制（-a 时按文本处理）。
+
+        :param skip_binary: 遇到二进制内容时直接结束。
+        :return: 批次的迭代器，见 _select。
+        """
+        line_number = 0
+        binary = False
+        context = self.before_lines or self.after_lines
+        for text, decoded in self._read_chunks(file):
+            if not binary and not self.text and (not decoded or '\0' in text):
+                if skip_binary:
+                    return
+                binary = True
+            lines = None
+            if matcher.prefilter and not self.invert_match and not matcher.search(text):
+                # 整块文本中都没有匹配时，不必逐行检查；需要上下文时只产出块首尾可能用作上下文的行
+                if context:
+                    lines = text.split('\n')
+                    edges = itertools.chain(range(min(self.after_lines, len(lines))),
+                                            range(max(self.after_lines, len(lines) - self.before_lines), len(lines)))
+                    yield [(line_number + i + 1, lines[i].rstrip('\r'), binary, None) for i in edges]
+                line_number += text.count('\n') + 1 if lines is None else len(lines)
+                continue
+            lines = text.split('\n')
+            if '\r' in text:
+                lines = [line.rstrip('\r') for line in lines]
+            yield self._select(lines, line_number + 1, matcher, binary)
+            line_number += len(lines)
+
+    def _scan_lines(self, lines, matcher, batch_size=4096):
+        """
+        分批检查管道输入，产出格式与 _scan_file 相同。
+        """
+        line_number = 1
+        for batch in iter_batches(lines, batch_size):
+            batch = [line.rstrip('\r\n') for line in batch]
+            yield self._select(batch, line_number, matcher)
+            line_number += len(batch)
+
+    def _select(self, lines, start, matcher, binary=False):
+        """
+        检查一批行，返回其中被选中的行。需要高亮时用一次 finditer 同时完成选择和定位匹配位置。
+
+        :param lines: 行列表（不含换行符）。
+        :param start: 第一行的行号。
+        :return: (行号, 行, 是否为二进制内容, 匹配位置) 的列表。匹配位置是 (起, 止) 列表（不需要高亮时为空元组）；
+                 需要上下文时也包含未被选中的行，其匹配位置为 None。
+        """
+        numbered = enumerate(lines, start)
+        if self.before_lines or self.after_lines:
+            selected = []
+            for line_number, line in numbered:
+                if self.highlight:
+                    spans = matcher.spans(line)
+                    chosen = bool(spans)
                 else:
-                    print(prefix, end='')
-                    idx = 0
-                    for m in pattern.finditer(line):
-                        l, r = m.span()
-                        print(line[idx: l], end='')
-                        # print((f"\033[1;31;41m{line[l:r]}\033[0m"), end='')
-                        print(HTML(f"<aaa bg='ansired'>{line[l:r]}</aaa>"), end='')
-                        idx = r
-                    print(line[idx:], end='')
+                    spans = ()
+                    chosen = bool(matcher.search(line)) != self.invert_match
+                selected.append((line_number, line, binary, spans if chosen else None))
+            return selected
+        if self.highlight:
+            spans = matcher.spans
+            return [(line_number, line, binary, line_spans) for line_number, line in numbered
+                    for line_spans in (spans(line),) if line_spans]
+        search = matcher.search
+        if self.invert_match:
+            return [(line_number, line, binary, ()) for line_number, line in numbered if not search(line)]
+        return [(line_number, line, binary, ()) for line_number, line in numbered if search(line)]
+
+    @staticmethod
+    def _read_chunks(file):
+        """
+        以二进制方式按块读取文件，产出按整行切分的文本块（不含最后的换行符）。
+        块只在换行符处切开，因此不会截断多字节字符。
+
+        :return: (文本, 是否能按 UTF-8 解码) 的迭代器，无法解码的字节替换为 U+FFFD。
+        """
+        def decode(data):
+            try:
+                return data.decode('utf-8'), True
+            except UnicodeDecodeError:
+                return data.decode('utf-8', errors='replace'), False
+
+        with open(file, 'rb') as f:
+            remainder = b''
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                data = remainder + chunk
+                cut = data.rfind(b'\n')
+                if cut < 0:
+                    remainder = data   # 超长的行，继续读取直到遇到换行符
+                    continue
+                data, remainder = data[:cut], data[cut + 1:]
+                yield decode(data)
+            if remainder:
+                yield decode(remainder)
+
+    def _format_line(self, line_number, line, spans):
+        """
+        格式化一行输出：整行作为一个片段列表，匹配部分高亮，终端渲染时只需一次调用。
+
+        :param spans: 匹配位置列表；None 表示上下文行，行号后用 - 标记。
+        """
+        prefix = (f"{line_number:6}  " if spans is not None else f"{line_number:6}- ") if self.line_number else ""
+        if not spans or not self.styled:
+            return f"{prefix}{line}"
+        fragments = [('', prefix)]
+        idx = 0
+        for l, r in spans:
+            fragments.append(('', line[idx:l]))
+            fragments.append(('bg:ansired', line[l:r]))
+            idx = r
+        fragments.append(('', line[idx:]))
+        return fragments
 
 # 示例用法
 if __name__ == "__main__":
@@ -109,4 +627,4 @@ if __name__ == "__main__":
 
     command = "def"
     grep_command = GrepCommand(command)
-    grep_command.execute(stream=stream)
+    grep_command.execute(input_lines=stream)
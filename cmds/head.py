@@ -1,59 +1,141 @@
 import argparse
+import collections
+import itertools
 import os
-from prompt_toolkit import HTML, print_formatted_text as print
+from typing import BinaryIO, Iterable, Iterator, TypeVar
 from cmds.base import Command
 
+CHUNK_SIZE = 1 << 16    # -c 读取文件时每次读取的字节数
+
+T = TypeVar('T')
+
+
+def _decode(line: bytes) -> str:
+    return line.decode('utf-8', errors='replace').rstrip('\r\n')
+
+
 class HeadCommand(Command):
-    def __init__(self, command: str) -> 'HeadCommand':
+    @classmethod
+    def build_parser(cls) -> argparse.ArgumentParser:
         """
-        解析 head 命令并返回 HeadCommand 实例。
+        构建 head 命令的参数解析器。
         """
         parser = argparse.ArgumentParser(description="Display the first N lines of each FILE.", add_help=False)
-        parser.add_argument("-n", "--lines", type=int, default=10, help="Number of lines to display (default: 10)")
+        parser.add_argument("-n", "--lines", type=int, default=10,
+                            help="Number of lines to display (default: 10); -K displays all but the last K lines")
+        parser.add_argument("-c", "--bytes", type=int,
+                            help="Display the first BYTES bytes instead of lines; -K displays all but the last K bytes")
         parser.add_argument("files", nargs="*", type=str, help="Files to display")
-        
-        self.parser = parser
-        super().__init__(command)
-
-    @Command.safe_exec
-    def execute(self, input_lines=None):
-        if input_lines:
-            # 从流中读取内容
-            self._print_lines(input_lines)
+        return parser
+
+    def run(self, input_lines=None):
+        if input_lines is not None:
+            # 从流中读取内容，读够之后不再读取，管道会通知上游停止
+            if self.bytes is not None:
+                chunks = (line.rstrip('\r\n').encode('utf-8', errors='replace') + b'\n' for line in input_lines)
+                yield from self._split_lines(self._head_bytes(chunks, self.bytes))
+            else:
+                yield from self._head_lines((line.rstrip('\r\n') for line in input_lines), self.lines)
+            return
+
+        if not self.files:
+            self.log("Error: No files specified and no input stream provided.")
+            return
+
+        for file_path in self.files:
+            file_path = self.normabs(file_path)
+            file_lists = self.get_file_list(file_path, include_dirs=False)
+
+            if not file_lists:
+                self.log(f"Error: File '{file_path}' does not exist or is not a file.")
+                continue
+
+            for file in file_lists:
+                yield [('bg:ansiblue', f"{file}:")]
+                try:
+                    with open(file, 'rb') as f:
+                        yield from self._head_file(f)
+                except Exception as e:
+                    self.log(f"Critical Error: Failed to read file '{file}': {e}", 'critical')
+
+    def _head_file(self, f: BinaryIO) -> Iterator[str]:
+        """
+        读取文件开头的内容。-c 只读取要输出的字节（-c -K 时按文件大小计算），
+        -n N 读够 N 行即停止，-n -K 只在有界队列中保留 K 行。
+        """
+        if self.bytes is not None:
+            limit = self.bytes
+            if limit < 0:
+                limit = max(os.fstat(f.fileno()).st_size + limit, 0)
+            yield from self._split_lines(self._read_chunks(f, limit))
         else:
-            if not self.files:
-                print(HTML("<error>Error: No files specified and no input stream provided.</error>"), style=self.log_style)
-                return
+            yield from (_decode(line) for line in self._head_lines(f, self.lines))
 
-            for file_path in self.files:
-                file_path = self.normabs(file_path)
-                file_lists = self.get_file_list(file_path)
+    @staticmethod
+    def _head_lines(lines: Iterable[T], count: int) -> Iterator[T]:
+        """
+        产出前 count 行，读够后立即停止，不再读取剩余部分；count 为负数时产出除最后 -count 行以外的所有行。
+        """
+        if count >= 0:
+            yield from itertools.islice(lines, count)
+            return
+        kept = collections.deque()
+        for line in lines:
+            kept.append(line)
+            if len(kept) > -count:
+                yield kept.popleft()
 
-                if not file_lists:
-                    print(HTML(f"<error>Error: File '{file_path}' does not exist or is not a file.</error>"), style=self.log_style)
-                    continue
+    @staticmethod
+    def _head_bytes(chunks: Iterable[bytes], count: int) -> Iterator[bytes]:
+        """
+        产出前 count 个字节；count 为负数时产出除最后 -count 个字节以外的内容，只缓存 -count 个字节。
+        """
+        if count >= 0:
+            for chunk in chunks:
+                if count <= 0:
+                    return
+                yield chunk[:count]
+                count -= len(chunk)
+            return
+        kept = bytearray()
+        for chunk in chunks:
+            kept += chunk
+            if len(kept) > -count:
+                end = len(kept) + count
+                yield bytes(kept[:end])
+                del kept[:end]
 
-                for file in file_lists:
-                    print(HTML(f"<aaa bg='ansiblue'>{file}:</aaa>"))
-                    try:
-                        with open(file, 'r', encoding='utf-8') as f:
-                            lines = f.readlines()
-                            self._print_lines(lines)
-                    except Exception as e:
-                        print(HTML(f"<critical>Critical Error: Failed to read file '{file}': {e}</critical>"), style=self.log_style)
+    @staticmethod
+    def _read_chunks(f: BinaryIO, limit: int) -> Iterator[bytes]:
+        """
+        分块读取文件的前 limit 个字节。
+        """
+        while limit > 0:
+            chunk = f.read(min(CHUNK_SIZE, limit))
+            if not chunk:
+                return
+            limit -= len(chunk)
+            yield chunk
 
-    def _print_lines(self, lines):
+    @staticmethod
+    def _split_lines(chunks: Iterable[bytes]) -> Iterator[str]:
         """
-        打印前 N 行内容。
+        把字节块按行解码产出，最后不以换行结束的部分作为单独一行。
         """
-        for line in lines[:self.lines]:
-            print(line.rstrip())
+        partial = b''
+        for chunk in chunks:
+            lines = (partial + chunk).split(b'\n')
+            partial = lines.pop()
+            for line in lines:
+                yield _decode(line)
+        if partial:
+            yield _decode(partial)
 
 if __name__ == "__main__":
     command = "-n 5 head.py"  # 示例命令
     head_command = HeadCommand(command)
     head_command.execute()
-    
+
     input_data = """
     def my_function():
         pass
@@ -66,9 +148,9 @@ if __name__ == "__main__":
         return "hello"
     """
     import io
-    
+
     stream = io.StringIO(input_data)
 
     command = "-n 5"
     grep_command = HeadCommand(command)
-    grep_command.execute(stream=stream)
+    grep_command.execute(input_lines=stream)
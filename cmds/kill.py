@@ -6,15 +6,14 @@ from cmds.base import Command
 
 class KillCommand(Command):
 
-    def __init__(self, command: str) -> 'KillCommand':
+    @classmethod
+    def build_parser(cls) -> argparse.ArgumentParser:
         """
-        解析 kill 命令并返回 KillCommand 实例。
+        构建 kill 命令的参数解析器。
         """
         parser = argparse.ArgumentParser(description="Terminate processes by PID.", add_help=False)
         parser.add_argument("pids", nargs='+', type=int, help="Process IDs to terminate")
-        
-        self.parser = parser
-        super().__init__(command)
+        return parser
 
     @Command.safe_exec
     def execute(self):
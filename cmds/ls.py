@@ -1,8 +1,7 @@
 import argparse
 from datetime import datetime
-from prompt_toolkit import HTML, print_formatted_text as print
+from prompt_toolkit import print_formatted_text as print
 import os
-import html
 from prompt_toolkit.styles import Style
 import shutil
 from wcwidth import wcswidth
@@ -30,6 +29,7 @@ class LsCommand(Command):
         'filesize': 'ansiyellow',
         'last_write_time': '#ffffff',
     })
+    output_style = file_style
     a: bool = False
     l: bool = False
     r: bool = False
@@ -39,12 +39,10 @@ class LsCommand(Command):
     h: bool = False
     s: bool = False
     
-    def __init__(self, command: str) -> 'LsCommand':
+    @classmethod
+    def build_parser(cls) -> argparse.ArgumentParser:
         """
-        从字符串解析 ls 命令并返回 LsCommand 实例。
-
-        :param command: 包含 ls 选项和路径的字符串
-        :return: LsCommand 实例
+        构建 ls 命令的参数解析器。
         """
         # 解析参数
         parser = argparse.ArgumentParser(description="Parse ls command options.", add_help=False)
@@ -58,9 +56,7 @@ class LsCommand(Command):
         parser.add_argument("-h", action="store_true", help="Display file sizes in human-readable format.") 
         parser.add_argument("-s", action="store_true", help="Sort by file size.")
         parser.add_argument("name", nargs="*", default=[], help="Paths to list. Defaults to current directory.")
-        
-        self.parser = parser
-        super().__init__(command)
+        return parser
         
     def get_file_info_list(self, path):
         files_info = []
@@ -68,9 +64,9 @@ class LsCommand(Command):
         for file in file_list:
             file_info = {}
             dirname = os.path.dirname(file)
-            file_info['basename'] = html.escape(os.path.basename(file)).replace('/', '')
-            file_info['dirname'] = html.escape(self.normabs(dirname))
-            file_info['fullpath'] = html.escape(self.normabs(file))
+            file_info['basename'] = os.path.basename(file).replace('/', '')
+            file_info['dirname'] = self.normabs(dirname)
+            file_info['fullpath'] = self.normabs(file)
             
             if os.path.isdir(file):
                 file_info['mode'] = 'd'
@@ -94,8 +90,7 @@ class LsCommand(Command):
             files_info.append(file_info)
         return files_info
             
-    @Command.safe_exec
-    def execute(self):
+    def run(self, input_lines=None):
         if not self.name:
             self.name = ['.']
         for path in self.name:
@@ -103,11 +98,13 @@ class LsCommand(Command):
             files_info = self.get_file_info_list(path)
             if self.l:
                 if self.R:
-                    print(HTML(f"<aaa bg='ansiblue'>{self.normabs(html.escape(path))}:</aaa>"))
+                    yield [('bg:ansiblue', f"{self.normabs(path)}:")]
                 else:
-                    print(HTML(f"<aaa bg='ansiblue'>{html.escape(path)}:</aaa>"))
+                    yield [('bg:ansiblue', f"{path}:")]
             if not files_info and not self.R:
-                print(HTML(f"<aaa bg='ansired'>cannot access '{html.escape(path)}': No such file or directory</aaa>\n"))
+                self.status = 1
+                yield [('bg:ansired', f"cannot access '{path}': No such file or directory")]
+                yield ''
                 continue
             files_info.sort(key=lambda x: x['basename'], reverse=self.r)
             if self.t:
@@ -115,7 +112,11 @@ class LsCommand(Command):
             if self.s:
                 files_info.sort(key=lambda x: x['size'], reverse=self.r)
             
-            if not self.l:
+            if not self.l and not self.styled:
+                # 不输出到终端时，每行一个文件名，无需计算排版
+                for file in files_info:
+                    yield file['basename']
+            elif not self.l:
                 # 获取终端宽度
                 terminal_width = int(shutil.get_terminal_size().columns)
                 # 从最大列数开始尝试
@@ -151,38 +152,42 @@ class LsCommand(Command):
 
                 # 打印结果
                 for row in range(rows):
-                    row_content = ''
+                    row_content = []
                     for col in range(columns):
                         index = col * rows + row
                         if index < num_files:
                             item = files_info[index]
                             # 动态填充宽度（考虑非 ASCII 字符）
                             padding = col_widths[col] - display_width(item['basename'])
-                            if files_info[index]['mode'] == 'd':
-                                item = f"<directory>{item['basename']}</directory>"
+                            if item['mode'] == 'd':
+                                row_content.append(('class:directory', item['basename']))
                                 if self.F:
-                                    item += '/'
+                                    row_content.append(('', '/'))
                                     padding -= 1
-                            elif files_info[index]['mode'] == 'l':
-                                item = f"<link>{item['basename']}</link>"
+                            elif item['mode'] == 'l':
+                                row_content.append(('class:link', item['basename']))
                                 if self.F:
-                                    item += '*'
+                                    row_content.append(('', '*'))
                                     padding -= 1
                             else:
-                                item = f"<file>{item['basename']}</file>"
-                            row_content += item + " " * padding
-                    print(HTML(row_content), style=self.file_style)
+                                row_content.append(('class:file', item['basename']))
+                            row_content.append(('', " " * padding))
+                    yield row_content
             else:
                 for file in files_info:
                     size = file['h_size'] if self.h else file['size']
-                    print(HTML(f"<filesize>{size:>12}</filesize>"), style=self.file_style, end='  ')
-                    print(HTML(f"<last_write_time>{file['last_write_time']}</last_write_time>"), style=self.file_style, end='  ')
+                    line = [
+                        ('class:filesize', f"{size:>12}"), ('', '  '),
+                        ('class:last_write_time', file['last_write_time']), ('', '  '),
+                    ]
                     if file['mode'] == 'd':
-                        print(HTML(f"<directory>{file['basename']}{'/' if self.F else ''}</directory>"), style=self.file_style)
+                        line.append(('class:directory', f"{file['basename']}{'/' if self.F else ''}"))
                     elif file['mode'] == 'l':
-                        print(HTML(f"<link>{file['basename']}</link>{'*' if self.F else ''}"), style=self.file_style)
+                        line.append(('class:link', file['basename']))
+                        line.append(('', '*' if self.F else ''))
                     else:
-                        print(HTML(f"<file>{file['basename']}</file>"), style=self.file_style)
+                        line.append(('class:file', file['basename']))
+                    yield line
             
             if self.R and files_info:
                 directories = []
@@ -192,7 +197,7 @@ class LsCommand(Command):
                 if not directories:
                     continue
                 self.name = directories
-                self.execute()
+                yield from self.run()
                 
 if __name__ == "__main__":
     # 输入 lsr 命令的字符串
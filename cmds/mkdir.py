@@ -5,17 +5,16 @@ from cmds.base import Command
 
 class MkdirCommand(Command):
 
-    def __init__(self, command: str) -> 'MkdirCommand':
+    @classmethod
+    def build_parser(cls) -> argparse.ArgumentParser:
         """
-        解析 mkdir 命令并返回 MkdirCommand 实例。
+        构建 mkdir 命令的参数解析器。
         """
         parser = argparse.ArgumentParser(description="Create directories.", add_help=False)
         parser.add_argument("-p", "--parents", action="store_true", help="Create parent directories as needed")
         parser.add_argument("-m", "--mode", type=int, help="Set file mode (as in chmod), not a=rw - umask")
         parser.add_argument("dirs", nargs='+', help="Directory to create")
-
-        self.parser = parser
-        super().__init__(command)
+        return parser
 
     @Command.safe_exec
     def execute(self):
@@ -1,21 +1,22 @@
 import argparse
+import errno
+import functools
 import os
 import shutil
-from prompt_toolkit import HTML, print_formatted_text as print
+import stat
+from typing import Dict, List, Tuple
 from cmds.base import Command
+from cmds.core.fileops import Progress, copy_file, is_real_dir, remove_file, run_parallel, walk_tree
+
+RENAME_REFRESH = 1000      # 批量重命名时每处理这么多项刷新一次进度
+
 
 class MvCommand(Command):
-    force: bool = False  # 是否强制覆盖目标文件
-    verbose: bool = False  # 是否显示详细信息
-    interactive: bool = False  # 是否在覆盖前提示用户
-    no_clobber: bool = False  # 是否禁止覆盖文件
-    verbose: bool = False  # 是否显示详细信息
 
-    def __init__(self, command: str) -> 'MvCommand':
+    @classmethod
+    def build_parser(cls) -> argparse.ArgumentParser:
         """
-        解析 mv 命令并返回 MvCommand 实例。
-
-        :param command: 包含 mv 命令选项和参数的字符串。
+        构建 mv 命令的参数解析器。
         """
         # 解析命令行参数
         parser = argparse.ArgumentParser(description="Move files or directories.", add_help=False)
@@ -26,61 +27,178 @@ class MvCommand(Command):
         parser.add_argument("-v", "--verbose", action="store_true", help="Show verbose output")
         parser.add_argument("src", type=str, help="Source file or directory")
         parser.add_argument("dst", type=str, help="Destination file or directory")
-        
-        # 解析命令
-        self.parser = parser
-        super().__init__(command)
+        return parser
 
     @Command.safe_exec
     def execute(self):
-        if self.help:
-            self.parser.print_help()
-            return
-        srcs = self.get_file_list(self.src)
+        # 目录本身作为源，不展开其中的文件；通配符展开为多个源
+        srcs = self.get_file_list(self.normabs(self.src), traverse=False)
 
         # 检查源路径是否存在
         if not srcs:
-            print(HTML(f"<error>Error: Source '{self.src}' does not exist.</error>"), style=self.log_style)
+            self.log(f"Error: Source '{self.src}' does not exist.")
+            self.status = 1
             return
 
+        dst_root = self.normabs(self.dst)
+        dst_is_dir = os.path.isdir(dst_root)
+        if len(srcs) > 1 and not dst_is_dir:
+            self.log(f"Error: Target '{self.dst}' is not a directory.")
+            self.status = 1
+            return
+
+        # 按源和目标所在的设备分组：同一文件系统内直接重命名，跨设备的才需要复制后删除
+        progress = Progress("Moved", len(srcs))
+        renames: List[Tuple[str, str]] = []
+        transfers: List[Tuple[str, str]] = []
+        devices: Dict[str, int] = {}
         for src in srcs:
-            src = self.normabs(src)
-            dst = self.normabs(self.dst)
-            # 如果目标是目录，拼接源文件名到目标路径
-            if os.path.isdir(dst):
-                dst = os.path.join(dst, os.path.basename(src))
-
-            # 如果目标文件已存在
-            if os.path.exists(dst):
-                if self.no_clobber:
-                    # 不覆盖现有文件
-                    print(HTML(f"<warning>Skipped: '{dst}' already exists.</warning>"), style=self.log_style)
-                    return
-                elif self.interactive:
-                    # 提示用户确认
-                    response = input(f"Overwrite '{dst}'? [y/N]: ").strip().lower()
-                    if response not in ['y', 'yes']:
-                        print(HTML(f"<warning>Skipped: '{dst}' not overwritten.</warning>"))
-                        return
-                elif self.backup:
-                    # 创建备份文件
-                    backup_path = dst + ".bak"
-                    shutil.move(dst, backup_path)
-                    if self.verbose:
-                        print(HTML(f"<success>Backup created: '{backup_path}'</success>"), style=self.log_style)
-                elif not self.force:
-                    # 非强制模式直接报错
-                    print(HTML(f"<aaa bg='ansired'>Error: '{dst}' already exists. Use -f to force overwrite.</aaa>"))
-                    return
-
-            # 执行移动操作
+            # 源已经由绝对路径展开得到，不再逐个规范化
+            dst = os.path.join(dst_root, os.path.basename(src)) if dst_is_dir else dst_root
             try:
-                shutil.move(src, dst)
-                if self.verbose:
-                    print(HTML(f"Moved <aaa fg='ansiyellow'>'{src}'</aaa> to <aaa fg='ansigreen'>'{dst}'</aaa>"))
-            except Exception as e:
-                print(HTML(f"<critical>Error: {e}</critical>"), style=self.log_style)
-            
+                info = os.lstat(src)
+            except OSError as e:
+                progress.fail(src, e)
+                continue
+            if stat.S_ISDIR(info.st_mode) and (dst == src or dst.startswith(src + os.sep)):
+                self.log(f"Error: Cannot move '{src}' into itself.")
+                self.status = 1
+                continue
+            # 如果目标已存在，按 -n/-i/-b/-f 决定是否覆盖，跳过的源不影响其它源
+            if os.path.lexists(dst) and not self._may_overwrite(dst):
+                continue
+
+            parent = dst_root if dst_is_dir else os.path.dirname(dst)
+            if parent not in devices:
+                try:
+                    devices[parent] = os.stat(parent).st_dev
+                except OSError as e:
+                    progress.fail(dst, e)
+                    continue
+            (renames if devices[parent] == info.st_dev else transfers).append((src, dst))
+
+        moved = self._rename_all(renames, progress, transfers)
+        for src, dst in transfers:
+            if self._transfer(src, dst, progress):
+                moved.append((src, dst))
+
+        for path, message in progress.errors:
+            self.log(f"Error: Failed to move '{path}': {message}")
+        if progress.errors:
+            self.status = 1
+        if self.verbose:
+            for src, dst in moved:
+                self.log(f"Moved '{src}' to '{dst}'", 'success')
+        if self.verbose or progress.displayed:
+            self.log(progress.summary(), 'success')
+
+    def _may_overwrite(self, dst: str) -> bool:
+        """
+        目标已经存在时，判断是否继续移动；-b 时先把已有的目标改名为备份。
+        """
+        if self.no_clobber:
+            # 不覆盖现有文件
+            self.log(f"Skipped: '{dst}' already exists.", 'warning')
+            return False
+        if self.interactive:
+            # 提示用户确认
+            response = input(f"Overwrite '{dst}'? [y/N]: ").strip().lower()
+            if response not in ['y', 'yes']:
+                self.log(f"Skipped: '{dst}' not overwritten.", 'warning')
+                return False
+        elif self.backup:
+            # 创建备份文件
+            backup_path = dst + ".bak"
+            try:
+                shutil.move(dst, backup_path)
+            except OSError as e:
+                self.log(f"Error: Failed to back up '{dst}': {e}")
+                self.status = 1
+                return False
+            if self.verbose:
+                self.log(f"Backup created: '{backup_path}'", 'success')
+        elif not self.force:
+            # 非强制模式直接报错
+            self.log(f"Error: '{dst}' already exists. Use -f to force overwrite.")
+            self.status = 1
+            return False
+        return True
+
+    @staticmethod
+    def _rename_all(renames: List[Tuple[str, str]], progress: Progress,
+                    transfers: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """
+        在同一文件系统内逐个原子地重命名。设备号相同却仍然不能重命名的（例如 overlay 文件系统上的目录），
+        改为复制后删除，加入 transfers。
+
+        :return: 成功移动的 (源, 目标)。
+        """
+        moved = []
+        try:
+            for index, (src, dst) in enumerate(renames):
+                try:
+                    os.replace(src, dst)
+                except OSError as e:
+                    if e.errno == errno.EXDEV:
+                        transfers.append((src, dst))
+                    else:
+                        progress.fail(src, e)
+                    continue
+                moved.append((src, dst))
+                progress.files += 1
+                if index % RENAME_REFRESH == 0:
+                    progress.refresh()
+        finally:
+            progress.clear()
+        return moved
+
+    def _transfer(self, src: str, dst: str, progress: Progress) -> bool:
+        """
+        跨设备移动一个源：先在多个线程中复制（保留时间戳等属性），每个文件复制完立即删除源文件，
+        最后从下往上删除已经清空的源目录。
+
+        :return: 源是否已经全部移动。
+        """
+        errors = len(progress.errors)
+        # 符号链接和目录联接作为链接本身移动，不进入其中，避免删除链接目标中的文件
+        if not is_real_dir(src):
+            run_parallel(functools.partial(self._move_file, progress), [(src, dst)], progress, path=lambda job: job[0])
+            return len(progress.errors) == errors
+
+        sub_dirs, sub_files = walk_tree(src, progress)
+        dirs = [(src, dst)] + [(os.path.join(src, name), os.path.join(dst, name)) for name in sub_dirs]
+        for src_dir, dst_dir in dirs:
+            try:
+                os.makedirs(dst_dir, exist_ok=True)
+            except OSError as e:
+                progress.fail(dst_dir, e)
+        if progress.total_files is not None:
+            progress.total_files += len(sub_files) - 1
+        files = ((os.path.join(src, name), os.path.join(dst, name)) for name in sub_files)
+        run_parallel(functools.partial(self._move_file, progress), files, progress, path=lambda job: job[0])
+
+        for src_dir, dst_dir in reversed(dirs):
+            try:
+                shutil.copystat(src_dir, dst_dir)
+                os.rmdir(src_dir)
+            except OSError as e:
+                # 目录中有复制失败而保留下来的文件，失败的文件已经单独报告
+                if e.errno != errno.ENOTEMPTY:
+                    progress.fail(src_dir, e)
+        return len(progress.errors) == errors
+
+    @staticmethod
+    def _move_file(progress: Progress, job: Tuple[str, str]):
+        """
+        在工作线程中把一个文件复制到另一个设备上，然后删除源文件。
+        """
+        src, dst = job
+        if is_real_dir(dst):
+            raise IsADirectoryError(errno.EISDIR, f"Cannot overwrite directory '{dst}'")
+        size = copy_file(src, dst, preserve=True, follow_symlinks=False)
+        remove_file(src)
+        progress.add(size)
+
 
 # 主程序
 if __name__ == "__main__":
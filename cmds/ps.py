@@ -1,23 +1,20 @@
 import argparse
 import psutil
-from prompt_toolkit import HTML, print_formatted_text as print
 from cmds.base import Command
 
 class PsCommand(Command):
-    def __init__(self, command: str) -> 'PsCommand':
+    @classmethod
+    def build_parser(cls) -> argparse.ArgumentParser:
         """
-        解析 ps 命令并返回 PsCommand 实例。
+        构建 ps 命令的参数解析器。
         """
         parser = argparse.ArgumentParser(description="Display information about running processes.", add_help=False)
         parser.add_argument("-a", "--all", action="store_true", help="Show all processes")
         parser.add_argument("-u", "--user", action="store_true", help="Show processes for the current user")
         parser.add_argument("-v", "--verbose", action="store_true", help="Show verbose output")
-        
-        self.parser = parser
-        super().__init__(command)
+        return parser
 
-    @Command.safe_exec
-    def execute(self):
+    def run(self, input_lines=None):
         # 显示所有进程
         processes = psutil.process_iter(['pid', 'name', 'username', 'status'])
         process_list = []
@@ -32,13 +29,13 @@ class PsCommand(Command):
                 continue
 
         if not process_list:
-            print(HTML("<warning>No processes found.</warning>"), style=self.log_style)
+            self.log("No processes found.", 'warning')
             return
 
         # 打印进程信息
         if self.verbose:
-            print(HTML("<b>PID  | Name                       | User                      | Status</b>"))
-            print("-" * 50)
+            yield [('bold', "PID  | Name                       | User                      | Status")]
+            yield "-" * 50
 
         for proc in process_list:
             # 格式化输出
@@ -46,7 +43,7 @@ class PsCommand(Command):
             name = proc['name'][:25]  # 限制名称长度
             user = proc['username'][:25]  # 限制用户名长度
             status = proc['status']
-            print(HTML(f"{pid:<5} | {name:<25} | {user:<25} | {status}"))
+            yield f"{pid:<5} | {name:<25} | {user:<25} | {status}"
 
 # 示例用法
 if __name__ == "__main__":
@@ -1,28 +1,22 @@
 import argparse
 import os
 from cmds.base import Command
-from prompt_toolkit import print_formatted_text as print
 
 class PwdCommand(Command):
-    def __init__(self, command: str) -> 'PwdCommand':
+    @classmethod
+    def build_parser(cls) -> argparse.ArgumentParser:
         """
-        解析 pwd 命令并返回 PwdCommand 实例。
+        构建 pwd 命令的参数解析器。
         """
         parser = argparse.ArgumentParser(description="Print the current working directory.", add_help=False)
         parser.add_argument("-L", "--logical", action="store_true", help="Use PWD from the environment, even if it contains symbolic links")
         parser.add_argument("-P", "--physical", action="store_true", help="Avoid all symbolic links (default)")
-        
-        self.parser = parser
-        super().__init__(command)
+        return parser
 
-    @Command.safe_exec
-    def execute(self):
+    def run(self, input_lines=None):
         """
         执行 pwd 命令逻辑。
         """
-        if self.help:
-            self.parser.print_help()
-            return
         # 获取当前工作目录
         if self.logical:
             # 从环境变量中获取 PWD（可能包含符号链接）
@@ -31,8 +25,8 @@ class PwdCommand(Command):
             # 获取实际的物理路径
             pwd = os.path.realpath(os.getcwd())
 
-        # 打印工作目录
-        print(pwd, style=self.log_style)
+        # 输出工作目录
+        yield pwd
 
 # 示例用法
 if __name__ == "__main__":
@@ -1,72 +1,98 @@
 import argparse
 import os
-import shutil
-from prompt_toolkit import HTML, print_formatted_text as print
+import stat
 from cmds.base import Command
+from cmds.core.fileops import Progress, is_junction, remove_file, remove_tree
 
 class RmCommand(Command):
 
-    def __init__(self, command: str) -> 'RmCommand':
+    @classmethod
+    def build_parser(cls) -> argparse.ArgumentParser:
         """
-        解析 rm 命令并返回 RmCommand 实例。
+        构建 rm 命令的参数解析器。
         """
         parser = argparse.ArgumentParser(description="Remove files or directories.", add_help=False)
-        parser.add_argument("-i", "--interactive", action="store_true", help="Prompt before each removal")
+        parser.add_argument("-i", "--interactive", action="store_true", help="Prompt once before removing each argument")
         parser.add_argument("-f", "--force", action="store_true", help="Ignore nonexistent files and never prompt")
         parser.add_argument("-r", "--recursive", action="store_true", help="Remove directories and their contents recursively")
         parser.add_argument("-v", "--verbose", action="store_true", help="Show verbose output")
         parser.add_argument("targets", nargs='+', type=str, help="Files or directories to remove")
-        
-        self.parser = parser
-        super().__init__(command)
+        return parser
 
     @Command.safe_exec
     def execute(self):
+        progress = Progress("Removed")
+        dirs = 0
         for target in self.targets:
             target_path = self.normabs(target)
             target_files = self.get_file_list(target_path, traverse=False)
-            
+
             # 检查路径是否存在
             if not target_files:
                 if not self.force:
-                    print(HTML(f"<error>Error: '{target}' does not exist.</error>"), style=self.log_style)
+                    self.log(f"Error: '{target}' does not exist.")
+                    self.status = 1
                 continue
 
             for target_path in target_files:
-                # 处理目录删除
-                if os.path.isdir(target_path):
+                try:
+                    info = os.lstat(target_path)
+                except OSError as e:
+                    progress.fail(target_path, e)
+                    continue
+                is_dir = stat.S_ISDIR(info.st_mode) and not is_junction(info)
+
+                # 处理目录删除，指向目录的符号链接和目录联接只删除链接本身
+                if is_dir:
                     if not self.recursive:
-                        print(HTML(f"<error>Error: '{target}' is a directory. Use -r to remove directories.</error>"), style=self.log_style)
+                        self.log(f"Error: '{target_path}' is a directory. Use -r to remove directories.")
+                        self.status = 1
                         continue
-                    
-                    if self.interactive:
-                        response = input(f"Remove directory '{target}' and its contents? [y/N]: ").strip().lower()
-                        if response not in ['y', 'yes']:
-                            print(HTML(f"<warning>Skipped: '{target}' not removed.</warning>"), style=self.log_style)
-                            continue
-
-                    try:
-                        shutil.rmtree(target_path, ignore_errors=self.force)
-                        if self.verbose:
-                            print(HTML(f"<success>Removed directory '{target}'</success>"), style=self.log_style)
-                    except Exception as e:
-                        print(HTML(f"<critical>Critical Error: Failed to remove '{target}': {e}</critical>"), style=self.log_style)
+                    if os.path.dirname(target_path) == target_path:
+                        self.log(f"Error: Refusing to remove root directory '{target_path}'.")
+                        self.status = 1
+                        continue
+                    # -i 只对每个参数确认一次，不逐个文件询问
+                    if not self._confirm(f"Remove directory '{target_path}' and its contents? [y/N]: ", target_path):
+                        continue
+                    dirs += remove_tree(target_path, progress)
+                    if self.verbose and not os.path.lexists(target_path):
+                        self.log(f"Removed directory '{target_path}'", 'success')
 
                 # 处理文件删除
                 else:
-                    if self.interactive:
-                        response = input(f"Remove file '{target}'? [y/N]: ").strip().lower()
-                        if response not in ['y', 'yes']:
-                            print(HTML(f"<warning>Skipped: '{target}' not removed.</warning>"), style=self.log_style)
-                            continue
-
+                    if not self._confirm(f"Remove file '{target_path}'? [y/N]: ", target_path):
+                        continue
                     try:
-                        os.remove(target_path)
-                        if self.verbose:
-                            print(HTML(f"<success>Removed file '{target}'</success>"), style=self.log_style)
-                    except Exception as e:
-                        if not self.force:
-                            print(HTML(f"<critical>Critical Error: Failed to remove '{target}': {e}</critical>"), style=self.log_style)
+                        progress.add(remove_file(target_path))
+                    except OSError as e:
+                        progress.fail(target_path, e)
+                        continue
+                    if self.verbose:
+                        self.log(f"Removed file '{target_path}'", 'success')
+
+        # -f 只忽略不存在的参数，删除失败的项仍然报告，并给出实际删除的数量
+        for path, message in progress.errors:
+            self.log(f"Critical Error: Failed to remove '{path}': {message}", 'critical')
+        if progress.errors:
+            self.status = 1
+        if self.verbose or progress.displayed or progress.errors:
+            summary = progress.summary()
+            if dirs:
+                summary += f", {dirs} directories"
+            self.log(summary, 'success')
+
+    def _confirm(self, prompt: str, target_path: str) -> bool:
+        """
+        -i 时询问是否删除，拒绝时提示已跳过。
+        """
+        if not self.interactive:
+            return True
+        response = input(prompt).strip().lower()
+        if response not in ['y', 'yes']:
+            self.log(f"Skipped: '{target_path}' not removed.", 'warning')
+            return False
+        return True
 
 # 示例用法
 if __name__ == "__main__":
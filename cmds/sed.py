@@ -1,83 +1,455 @@
 import argparse
-import re
+import functools
 import os
-from prompt_toolkit import HTML, print_formatted_text as print
+import re
+import shutil
+import tempfile
+from typing import Iterable, Iterator, List, Optional, Tuple
 from cmds.base import Command
 
+
+class SedScriptError(ValueError):
+    """
+    sed 脚本的语法错误。
+    """
+
+
+class Address:
+    """
+    sed 的地址：行号、最后一行（$）或正则表达式。
+    """
+
+    def __init__(self, line_number: Optional[int] = None, regex: Optional[re.Pattern] = None):
+        self.line_number = line_number
+        self.regex = regex
+
+    @property
+    def is_last(self) -> bool:
+        return self.line_number is None and self.regex is None
+
+    def matches(self, line_number: int, line: str, last: bool) -> bool:
+        if self.regex is not None:
+            return self.regex.search(line) is not None
+        if self.line_number is not None:
+            return line_number == self.line_number
+        return last
+
+
+class Instruction:
+    """
+    编译后的一条 sed 命令及其地址。带有两个地址时是一个范围，范围是否处于打开状态记录在实例中，
+    因此每处理一个新的输入（文件或管道）之前需要调用 reset()。
+    """
+
+    def __init__(self, name: str, start: Optional[Address] = None, end: Optional[Address] = None, negate: bool = False):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.negate = negate
+        self.active = False
+
+    def reset(self):
+        self.active = False
+
+    def selects(self, line_number: int, line: str, last: bool) -> bool:
+        """
+        判断当前行是否被地址选中。
+        """
+        if self.start is None:
+            selected = True
+        elif self.end is None:
+            selected = self.start.matches(line_number, line, last)
+        elif self.active:
+            # 范围已经打开：结束地址是行号时，到达该行即关闭；否则在结束地址匹配的行关闭
+            if self.end.line_number is not None:
+                self.active = line_number < self.end.line_number
+            else:
+                self.active = not self.end.matches(line_number, line, last)
+            selected = True
+        elif self.start.matches(line_number, line, last):
+            # 结束地址是不大于当前行的行号时，范围只包含这一行；正则结束地址从下一行开始检查
+            if self.end.line_number is not None:
+                self.active = line_number < self.end.line_number
+            else:
+                self.active = not (self.end.is_last and last)
+            selected = True
+        else:
+            selected = False
+        return selected != self.negate
+
+
+class Substitution(Instruction):
+    """
+    s/regex/replacement/flags：替换第 occurrence 处匹配，带 g 时替换该处及之后的全部匹配。
+    """
+
+    def __init__(self, regex: re.Pattern, template: str, occurrence: int = 1, replace_all: bool = False,
+                 print_line: bool = False, **kwargs):
+        super().__init__('s', **kwargs)
+        self.regex = regex
+        self.template = template
+        self.occurrence = occurrence
+        self.replace_all = replace_all
+        self.print_line = print_line
+        if occurrence == 1:
+            # 常见情况直接使用 re 的替换，模板只编译一次
+            count = 0 if replace_all else 1
+            self.substitute = functools.partial(regex.subn, template, count=count)
+            if regex.pattern and re.escape(regex.pattern) == regex.pattern \
+                    and not regex.flags & re.IGNORECASE and '\\' not in template:
+                # 模式和替换文本都是纯文本时，str.replace 比正则引擎快得多
+                old, new, limit = regex.pattern, template, -1 if replace_all else 1
+                self.replace = lambda line: line.replace(old, new, limit)
+            elif replace_all:
+                self.replace = functools.partial(regex.sub, template)
+            else:
+                self.replace = lambda line, sub=regex.sub: sub(template, line, 1)
+        else:
+            self.substitute = self._substitute_nth
+            self.replace = lambda line: self._substitute_nth(line)[0]
+
+    def _substitute_nth(self, line: str) -> Tuple[str, int]:
+        seen = replaced = 0
+
+        def replace(match: re.Match) -> str:
+            nonlocal seen, replaced
+            seen += 1
+            if seen == self.occurrence or (self.replace_all and seen > self.occurrence):
+                replaced += 1
+                return match.expand(self.template)
+            return match.group(0)
+
+        return self.regex.sub(replace, line), replaced
+
+
+class ScriptParser:
+    """
+    把 sed 脚本编译为 Instruction 列表。支持的语法：
+      地址：N、$、/regex/（可带 I 忽略大小写）、\\cregexc，以及 addr1,addr2 范围和 ! 取反
+      命令：s/regex/replacement/[g][p][i|I][N]、d、p、q，命令之间用 ; 或换行分隔
+    正则表达式使用 Python 的语法，替换文本中的 & 表示整个匹配，\\1 到 \\9 表示分组。
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+
+    def parse(self) -> List[Instruction]:
+        instructions = []
+        while True:
+            self._skip(' \t\n;')
+            if self.pos >= len(self.text):
+                return instructions
+            start = self._address()
+            end = None
+            if start is not None and self._peek() == ',':
+                self.pos += 1
+                self._skip(' \t')
+                end = self._address()
+                if end is None:
+                    raise SedScriptError("unexpected ','")
+            self._skip(' \t')
+            negate = self._peek() == '!'
+            if negate:
+                self.pos += 1
+                self._skip(' \t')
+            name = self._next("missing command")
+            if name == 's':
+                instructions.append(self._substitution(start=start, end=end, negate=negate))
+            elif name in 'dpq':
+                if name == 'q' and end is not None:
+                    raise SedScriptError("command only uses one address")
+                instructions.append(Instruction(name, start=start, end=end, negate=negate))
+            else:
+                raise SedScriptError(f"unknown command: '{name}'")
+            self._skip(' \t')
+            if self.pos < len(self.text) and self._peek() not in ';\n':
+                raise SedScriptError(f"extra characters after command: '{self.text[self.pos:]}'")
+
+    def _peek(self) -> str:
+        return self.text[self.pos] if self.pos < len(self.text) else ''
+
+    def _next(self, error: str) -> str:
+        if self.pos >= len(self.text):
+            raise SedScriptError(error)
+        char = self.text[self.pos]
+        self.pos += 1
+        return char
+
+    def _skip(self, chars: str):
+        while self.pos < len(self.text) and self.text[self.pos] in chars:
+            self.pos += 1
+
+    def _address(self) -> Optional[Address]:
+        char = self._peek()
+        if char.isdigit():
+            start = self.pos
+            while self._peek().isdigit():
+                self.pos += 1
+            line_number = int(self.text[start:self.pos])
+            if line_number == 0:
+                raise SedScriptError("invalid usage of line address 0")
+            return Address(line_number=line_number)
+        if char == '$':
+            self.pos += 1
+            return Address()
+        if char in ('/', '\\'):
+            self.pos += 1
+            delimiter = self._next("unterminated address regex") if char == '\\' else '/'
+            pattern = self._delimited(delimiter, "unterminated address regex")
+            flags = 0
+            if self._peek() == 'I':
+                self.pos += 1
+                flags = re.IGNORECASE
+            return Address(regex=self._compile(pattern, flags))
+        return None
+
+    def _delimited(self, delimiter: str, error: str, literal_delimiter: bool = True) -> str:
+        """
+        读取到下一个未转义的分隔符为止，\\分隔符 表示分隔符本身，其余转义原样保留。
+        """
+        parts = []
+        while True:
+            char = self._next(error)
+            if char == delimiter:
+                return ''.join(parts)
+            if char == '\\':
+                escaped = self._next(error)
+                if escaped == delimiter:
+                    parts.append(re.escape(delimiter) if literal_delimiter else delimiter)
+                elif escaped == 'n':
+                    parts.append('\n')
+                else:
+                    parts.append('\\' + escaped)
+            else:
+                parts.append(char)
+
+    def _substitution(self, **kwargs) -> Substitution:
+        delimiter = self._next("unterminated `s' command")
+        if delimiter in '\n\\':
+            raise SedScriptError("unterminated `s' command")
+        pattern = self._delimited(delimiter, "unterminated `s' command")
+        replacement = self._delimited(delimiter, "unterminated `s' command", literal_delimiter=False)
+
+        occurrence, replace_all, print_line, flags = 1, False, False, 0
+        while self._peek() and self._peek() not in ' \t;\n':
+            flag = self._next('')
+            if flag == 'g':
+                replace_all = True
+            elif flag == 'p':
+                print_line = True
+            elif flag in 'iI':
+                flags |= re.IGNORECASE
+            elif flag.isdigit():
+                start = self.pos - 1
+                while self._peek().isdigit():
+                    self.pos += 1
+                occurrence = int(self.text[start:self.pos])
+                if occurrence == 0:
+                    raise SedScriptError("number option to `s' command may not be zero")
+            else:
+                raise SedScriptError(f"unknown option to `s': '{flag}'")
+        return Substitution(self._compile(pattern, flags), self._template(replacement), occurrence,
+                            replace_all, print_line, **kwargs)
+
+    @staticmethod
+    def _compile(pattern: str, flags: int) -> re.Pattern:
+        try:
+            return re.compile(pattern, flags)
+        except re.error as e:
+            raise SedScriptError(f"invalid regular expression '{pattern}': {e}")
+
+    @staticmethod
+    def _template(replacement: str) -> str:
+        """
+        把 sed 的替换文本转换为 re 的替换模板：& 为整个匹配，\\N 为分组，\\& 为字面的 &。
+        """
+        parts = []
+        i = 0
+        while i < len(replacement):
+            char = replacement[i]
+            if char == '\\' and i + 1 < len(replacement):
+                escaped = replacement[i + 1]
+                i += 2
+                if escaped.isdigit():
+                    parts.append(f"\\g<{escaped}>")
+                elif escaped == 't':
+                    parts.append('\t')
+                elif escaped == '\\':
+                    parts.append('\\\\')
+                else:
+                    parts.append(escaped)
+                continue
+            if char == '&':
+                parts.append('\\g<0>')
+            elif char == '\\':
+                parts.append('\\\\')
+            else:
+                parts.append(char)
+            i += 1
+        return ''.join(parts)
+
+
 class SedCommand(Command):
-    def __init__(self, command: str) -> 'SedCommand':
+    @classmethod
+    def build_parser(cls) -> argparse.ArgumentParser:
         """
-        解析 sed 命令并返回 SedCommand 实例。
+        构建 sed 命令的参数解析器。
         """
         parser = argparse.ArgumentParser(description="Stream editor for filtering and transforming text.", add_help=False)
-        parser.add_argument("-e", "--expression", type=str, required=True, help="The editing expression to apply (e.g., 's/pattern/replacement/')")
+        parser.add_argument("-e", "--expression", type=str, action="append",
+                            help="Add a script to the commands to run (e.g., 's/pattern/replacement/g', '2,/end/d'); "
+                                 "without -e the first argument is the script")
         parser.add_argument("-i", "--in-place", action="store_true", help="Edit files in place")
         parser.add_argument("-n", "--no-autoprint", action="store_true", help="Suppress automatic line printing")
         parser.add_argument("files", nargs="*", type=str, help="Files to process")
+        return parser
 
-        self.parser = parser
-        super().__init__(command)
+    def run(self, input_lines=None):
+        expressions = self.expression
+        if not expressions:
+            if not self.files:
+                self.log("Error: No script specified.")
+                self.status = 1
+                return
+            expressions = [self.files.pop(0)]
 
-    @Command.safe_exec
-    def execute(self, stream=None):
-        # 解析替换表达式
-        expression = self.expression
-        match = re.match(r's/([^/]+)/([^/]+)/?', expression)
-        if not match:
-            print(HTML(f"<error>Error: Invalid expression '{expression}'. Expected format: s/pattern/replacement/</error>"), style=self.log_style)
+        # 脚本只编译一次，所有输入共用
+        try:
+            script = ScriptParser('\n'.join(expressions)).parse()
+        except SedScriptError as e:
+            self.log(f"Error: Invalid script: {e}")
+            self.status = 1
             return
-        pattern, replacement = match.groups()
 
-        # 创建正则表达式
-        try:
-            compiled_pattern = re.compile(pattern)
-        except re.error as e:
-            print(HTML(f"<error>Error: Invalid regular expression '{pattern}': {e}</error>"), style=self.log_style)
+        if input_lines is not None and not self.files:
+            # 从流中逐行读取内容
+            yield from self._edit(input_lines, script)
             return
 
-        if stream:
-            # 从流中读取内容
-            lines = stream.readlines()
-            self._process_lines(lines, compiled_pattern, replacement)
-        else:
-            if not self.files:
-                print(HTML("<error>Error: No files specified and no input stream provided.</error>"), style=self.log_style)
-                return
+        if not self.files:
+            self.log("Error: No files specified and no input stream provided.")
+            self.status = 1
+            return
 
-            for file_path in self.files:
-                file_path = self.normabs(file_path)
-                file_lists = self.get_file_list(file_path)
+        for file_path in self.files:
+            file_path = self.normabs(file_path)
+            file_lists = self.get_file_list(file_path, include_dirs=False)
 
-                if not file_lists:
-                    print(HTML(f"<error>Error: File '{file_path}' does not exist or is not a file.</error>"), style=self.log_style)
+            if not file_lists:
+                self.status = 1
+                self.log(f"Error: File '{file_path}' does not exist or is not a file.")
+                continue
+
+            for file in file_lists:
+                try:
+                    if self.in_place:
+                        self._edit_in_place(file, script)
+                        continue
+                    yield [('bg:ansiblue', f"{file}:")]
+                    with open(file, 'r', encoding='utf-8', errors='replace') as f:
+                        yield from self._edit((line.rstrip('\r\n') for line in f), script)
+                except Exception as e:
+                    self.status = 1
+                    self.log(f"Critical Error: Failed to process file '{file}': {e}", 'critical')
+
+    def _edit(self, lines: Iterable[str], script: List[Instruction]) -> Iterator[str]:
+        """
+        对输入逐行执行脚本，产出输出的行。每个输入单独计算行号和范围。
+        """
+        for instruction in script:
+            instruction.reset()
+        autoprint = not self.no_autoprint
+
+        if len(script) == 1 and isinstance(script[0], Substitution) and script[0].start is None \
+                and not script[0].negate and not script[0].print_line and autoprint:
+            # 最常见的单条 s 命令：不需要逐条判断地址，直接映射每一行
+            yield from map(script[0].replace, lines)
+            return
+
+        if any(address is not None and address.is_last
+               for instruction in script for address in (instruction.start, instruction.end)):
+            numbered = self._mark_last(lines)
+        else:
+            numbered = ((line, False) for line in lines)
+
+        for line_number, (line, last) in enumerate(numbered, 1):
+            deleted = quit = False
+            for instruction in script:
+                if not instruction.selects(line_number, line, last):
                     continue
+                name = instruction.name
+                if name == 's':
+                    line, replaced = instruction.substitute(line)
+                    if replaced and instruction.print_line:
+                        yield line
+                elif name == 'p':
+                    yield line
+                elif name == 'd':
+                    deleted = True
+                    break
+                else:
+                    quit = True
+                    break
+            if autoprint and not deleted:
+                yield line
+            if quit:
+                return
+
+    @staticmethod
+    def _mark_last(lines: Iterable[str]) -> Iterator[Tuple[str, bool]]:
+        """
+        产出 (行, 是否最后一行)，需要多读一行来判断。只在脚本用到 $ 地址时使用。
+        """
+        iterator = iter(lines)
+        sentinel = object()
+        previous = next(iterator, sentinel)
+        if previous is sentinel:
+            return
+        for line in iterator:
+            yield previous, False
+            previous = line
+        yield previous, True
 
-                for file in file_lists:
-                    print(HTML(f"<aaa bg='ansiblue'>{file}:</aaa>"))
-                    try:
-                        with open(file, 'r', encoding='utf-8') as f:
-                            lines = f.readlines()
-                            new_lines = self._process_lines(lines, compiled_pattern, replacement)
-
-                        if self.in_place:
-                            # 如果是修改文件的操作
-                            with open(file, 'w', encoding='utf-8') as f:
-                                f.writelines(new_lines)
-                    except Exception as e:
-                        print(HTML(f"<critical>Critical Error: Failed to read file '{file}': {e}</critical>"), style=self.log_style)
-
-    def _process_lines(self, lines, pattern, replacement):
+    def _edit_in_place(self, file: str, script: List[Instruction]):
         """
-        处理输入的行，执行替换操作。
+        把结果写入同目录下的临时文件，写完并落盘后用 os.replace 原子地替换原文件，
+        中途出错或崩溃时原文件保持不变。保留原文件的换行风格、末尾是否有换行和权限，
+        无法解码的字节原样写回。
         """
-        new_lines = []
-        for line in lines:
-            new_line = re.sub(pattern, replacement, line)
-            new_lines.append(new_line)
-
-            if not self.no_autoprint:
-                print(new_line, end='')  # 默认打印修改后的内容
-        return new_lines
+        directory = os.path.dirname(file)
+        fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(file)}.", suffix=".sed", dir=directory)
+        try:
+            with open(file, 'r', encoding='utf-8', errors='surrogateescape', newline='') as src, \
+                    os.fdopen(fd, 'w', encoding='utf-8', errors='surrogateescape', newline='') as dst:
+                newline = '\n'
+                final_newline = True
+
+                def read_lines():
+                    nonlocal newline, final_newline
+                    for number, line in enumerate(src):
+                        if number == 0 and line.endswith('\r\n'):
+                            newline = '\r\n'
+                        final_newline = line.endswith('\n')
+                        yield line.rstrip('\r\n')
+
+                pending = None  # 最后一行在确认输入是否以换行结束之后再写
+                for line in self._edit(read_lines(), script):
+                    if pending is not None:
+                        dst.write(pending + newline)
+                    pending = line
+                if pending is not None:
+                    dst.write(pending + newline if final_newline else pending)
+                dst.flush()
+                os.fsync(dst.fileno())
+            shutil.copymode(file, temp_path)
+            os.replace(temp_path, file)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
 
 if __name__ == "__main__":
     command = "-i -e s/replace/asda/  hello.txt"  # 将 "test" 替换为 "replace"
@@ -1,53 +1,319 @@
 import argparse
+import collections
 import os
-from prompt_toolkit import HTML, print_formatted_text as print
-from cmds.base import Command
+import time
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+from cmds.base import Command, Line
+from cmds.core.pipeline import POLL_INTERVAL, flush_stage, stage_cancelled
+
+if os.name == 'nt':
+    import _winapi
+    import msvcrt
+
+BLOCK_SIZE = 1 << 16        # 从文件末尾向前读取时每块的字节数
+FOLLOW_READ_LIMIT = 1 << 20 # 跟踪时每个文件每轮最多读取的字节数，避免一个文件独占输出
+
+
+def _decode(line: bytes) -> str:
+    return line.decode('utf-8', errors='replace').rstrip('\r')
+
+
+def _open_shared(path: str) -> BinaryIO:
+    """
+    以二进制只读方式打开要跟踪的文件。Windows 上 open() 打开的文件不允许其它进程删除或重命名，
+    跟踪期间写日志的程序无法轮转日志；这里用 CreateFile 加上 FILE_SHARE_DELETE 打开，与 POSIX 上的行为一致。
+    """
+    if os.name != 'nt':
+        return open(path, 'rb')
+    share = 0x1 | 0x2 | 0x4     # FILE_SHARE_READ | FILE_SHARE_WRITE | FILE_SHARE_DELETE
+    handle = _winapi.CreateFile(path, _winapi.GENERIC_READ, share, _winapi.NULL, _winapi.OPEN_EXISTING,
+                                0x80, _winapi.NULL)     # FILE_ATTRIBUTE_NORMAL
+    try:
+        fd = msvcrt.open_osfhandle(handle, os.O_RDONLY | os.O_BINARY)
+    except BaseException:
+        _winapi.CloseHandle(handle)
+        raise
+    return os.fdopen(fd, 'rb')
+
+
+class FollowedFile:
+    """
+    -f/-F 跟踪中的一个文件：打开的文件、文件标识、已经读到的位置，以及还没有以换行结束的半行。
+    """
+
+    def __init__(self, path: str, file: Optional[BinaryIO] = None):
+        self.path = path
+        self.file = None
+        self.ident = None
+        self.position = 0
+        self.partial = b''
+        self.missing = file is None
+        if file is not None:
+            self.attach(file, file.tell())
+
+    def attach(self, file: BinaryIO, position: int = 0):
+        """
+        开始跟踪一个已经打开的文件，从 position 处继续读取。
+        """
+        self.close()
+        stat = os.fstat(file.fileno())
+        self.file, self.ident = file, (stat.st_dev, stat.st_ino)
+        self.position = position
+        self.partial = b''
+        self.missing = False
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
 
 class TailCommand(Command):
-    def __init__(self, command: str) -> 'TailCommand':
+    @classmethod
+    def build_parser(cls) -> argparse.ArgumentParser:
         """
-        解析 tail 命令并返回 TailCommand 实例。
+        构建 tail 命令的参数解析器。
         """
         parser = argparse.ArgumentParser(description="Display the last N lines of each FILE.", add_help=False)
         parser.add_argument("-n", "--lines", type=int, default=10, help="Number of lines to display (default: 10)")
+        parser.add_argument("-c", "--bytes", type=int, help="Display the last BYTES bytes instead of lines")
+        parser.add_argument("-f", "--follow", action="store_true", help="Output appended data as the file grows")
+        parser.add_argument("-F", dest="follow_name", action="store_true",
+                            help="Like -f, but reopen the file by name when it is rotated, removed or recreated")
+        parser.add_argument("-s", "--sleep-interval", type=float, default=1.0,
+                            help="With -f/-F, seconds to wait between checks for new data (default: 1.0)")
         parser.add_argument("files", nargs="*", type=str, help="Files to display")
-        
-        self.parser = parser
-        super().__init__(command)
-
-    @Command.safe_exec
-    def execute(self, input_lines=None):
-        if input_lines:
-            # 从流中读取内容
-            self._print_lines(input_lines)
-        else:
-            if not self.files:
-                print(HTML("<error>Error: No files specified and no input stream provided.</error>"), style=self.log_style)
-                return
+        return parser
 
+    def run(self, input_lines=None):
+        if input_lines is not None:
+            # 从流中读取内容，流没有可以跟踪的文件，-f/-F 被忽略
+            if self.bytes is not None:
+                yield from self._tail_stream_bytes(input_lines)
+            else:
+                yield from self._tail_lines(input_lines)
+            return
+
+        if not self.files:
+            self.log("Error: No files specified and no input stream provided.")
+            return
+
+        follow = self.follow or self.follow_name
+        watched: List[FollowedFile] = []
+        try:
             for file_path in self.files:
                 file_path = self.normabs(file_path)
-                file_lists = self.get_file_list(file_path)
+                file_lists = self.get_file_list(file_path, include_dirs=False)
 
                 if not file_lists:
-                    print(HTML(f"<error>Error: File '{file_path}' does not exist or is not a file.</error>"), style=self.log_style)
+                    self.status = 1
+                    if self.follow_name:
+                        # -F 会一直等待文件出现
+                        self.log(f"Warning: Cannot open '{file_path}', waiting for it to appear.", 'warning')
+                        watched.append(FollowedFile(file_path))
+                    else:
+                        self.log(f"Error: File '{file_path}' does not exist or is not a file.")
                     continue
 
                 for file in file_lists:
-                    print(HTML(f"<aaa bg='ansiblue'>{file}:</aaa>"))
+                    yield [('bg:ansiblue', f"{file}:")]
+                    try:
+                        f = _open_shared(file) if follow else open(file, 'rb')
+                    except OSError as e:
+                        self.status = 1
+                        self.log(f"Critical Error: Failed to read file '{file}': {e}", 'critical')
+                        continue
                     try:
-                        with open(file, 'r', encoding='utf-8') as f:
-                            lines = f.readlines()
-                            self._print_lines(lines)
-                    except Exception as e:
-                        print(HTML(f"<critical>Critical Error: Failed to read file '{file}': {e}</critical>"), style=self.log_style)
+                        yield from self._tail_file(f)
+                    except BaseException:
+                        f.close()
+                        raise
+                    if follow:
+                        watched.append(FollowedFile(file, f))
+                    else:
+                        f.close()
+
+            if follow and watched:
+                yield from self._follow(watched)
+        finally:
+            for item in watched:
+                item.close()
+
+    def _tail_lines(self, lines: Iterable[str]) -> Iterator[str]:
+        """
+        产出最后 N 行内容，只在有界队列中保留 N 行。
+        """
+        for line in collections.deque(lines, maxlen=max(self.lines, 0)):
+            yield line.rstrip('\r\n')
+
+    def _tail_stream_bytes(self, lines: Iterable[str]) -> Iterator[str]:
+        """
+        产出流中最后 BYTES 个字节（按 UTF-8 计算，每行含一个换行符），只保留覆盖这些字节所需的行。
+        """
+        limit = max(self.bytes, 0)
+        kept = collections.deque()
+        size = 0
+        for line in lines:
+            data = line.rstrip('\r\n').encode('utf-8', errors='replace') + b'\n'
+            kept.append(data)
+            size += len(data)
+            while kept and size - len(kept[0]) >= limit:
+                size -= len(kept.popleft())
+        yield from self._split(b''.join(kept)[-limit:] if limit else b'')
+
+    def _tail_file(self, f: BinaryIO) -> Iterator[str]:
+        """
+        从文件末尾读取最后 N 行（或 BYTES 个字节），读取量只与输出的大小有关，与文件大小无关。
+        结束后文件位置停在读取时的文件末尾，-f 从这里继续。
+        """
+        size = os.fstat(f.fileno()).st_size
+        if self.bytes is not None:
+            start = max(size - max(self.bytes, 0), 0)
+            f.seek(start)
+            data = f.read(size - start)
+        else:
+            data = self._read_last_lines(f, size, max(self.lines, 0))
+        f.seek(size)
+        yield from self._split(data)
+
+    @staticmethod
+    def _read_last_lines(f: BinaryIO, size: int, count: int) -> bytes:
+        """
+        从 size 处按块向前读取，直到读到 count 行为止。
+
+        :return: 最后 count 行的字节串，文件不足 count 行时为整个文件。
+        """
+        if count == 0:
+            return b''
+        blocks = []
+        position = size
+        newlines = 0
+        needed = count
+        while position > 0:
+            read_size = min(BLOCK_SIZE, position)
+            position -= read_size
+            f.seek(position)
+            block = f.read(read_size)
+            if not blocks and block.endswith(b'\n'):
+                # 文件末尾的换行符结束最后一行，不是行之间的分隔
+                needed = count + 1
+            blocks.append(block)
+            newlines += block.count(b'\n')
+            if newlines >= needed:
+                break
+        data = b''.join(reversed(blocks))
+        if newlines < needed:
+            return data
+        # 第 needed 个换行符（从末尾数）之后就是最后 count 行
+        start = len(data)
+        for _ in range(needed):
+            start = data.rindex(b'\n', 0, start)
+        return data[start + 1:]
+
+    @staticmethod
+    def _split(data: bytes) -> Iterator[str]:
+        """
+        把读到的字节按行解码产出，末尾的换行符不产生空行。
+        """
+        if not data:
+            return
+        lines = data.split(b'\n')
+        if data.endswith(b'\n'):
+            lines.pop()
+        for line in lines:
+            yield _decode(line)
+
+    def _follow(self, watched: List[FollowedFile]) -> Iterator[Line]:
+        """
+        -f/-F：轮询各个文件的大小，有新内容时产出新增的完整行，直到 Ctrl-C 或管道结束。
+        跟踪多个文件时，输出切换到另一个文件之前先输出该文件的标题。
+        """
+        current = watched[-1] if watched[-1].file is not None else None
+        try:
+            while not stage_cancelled():
+                active = False
+                for item in watched:
+                    lines = self._poll(item)
+                    if not lines:
+                        continue
+                    active = True
+                    if item is not current:
+                        yield [('bg:ansiblue', f"{item.path}:")]
+                        current = item
+                    yield from lines
+                if not active:
+                    # 等待之前先把已产出的行送出去，避免它们停留在批次或终端缓冲区中
+                    flush_stage()
+                    self._sleep(max(self.sleep_interval, 0.0))
+        except KeyboardInterrupt:
+            pass
+
+    @staticmethod
+    def _sleep(interval: float):
+        """
+        等待 interval 秒，期间管道被取消时提前返回。
+        """
+        deadline = time.monotonic() + interval
+        while not stage_cancelled():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(remaining, POLL_INTERVAL))
+
+    def _poll(self, item: FollowedFile) -> List[str]:
+        """
+        读取文件新增的完整行。-F 时还会检查文件名是否已指向另一个文件（日志轮转、删除后重建），
+        先读完旧文件剩余的内容，再从头读取新文件。
+        """
+        lines = self._read_new(item)
+        if self.follow_name and self._replaced(item):
+            if item.partial:
+                lines.append(_decode(item.partial))
+            was_missing = item.file is None
+            try:
+                item.attach(_open_shared(item.path))
+            except OSError:
+                item.close()
+                item.missing = True
+                return lines
+            state = "appeared" if was_missing else "been replaced"
+            self.log(f"Warning: '{item.path}' has {state}; following new file.", 'warning')
+            lines.extend(self._read_new(item))
+        return lines
+
+    def _replaced(self, item: FollowedFile) -> bool:
+        """
+        文件名现在指向的文件是否与正在读取的不同。文件不存在时继续读取已打开的文件，等待它重新出现。
+        """
+        try:
+            stat = os.stat(item.path)
+        except OSError:
+            if not item.missing:
+                item.missing = True
+                self.log(f"Warning: '{item.path}' has become inaccessible.", 'warning')
+            return False
+        return item.file is None or (stat.st_dev, stat.st_ino) != item.ident
 
-    def _print_lines(self, lines):
+    def _read_new(self, item: FollowedFile) -> List[str]:
         """
-        打印最后 N 行内容。
+        读取文件自上次以来新增的内容，返回其中的完整行，不完整的最后一行留到下次。
+        文件变短时认为被截断，从头开始读取。
         """
-        for line in lines[-self.lines:]:
-            print(line.rstrip())
+        if item.file is None:
+            return []
+        size = os.fstat(item.file.fileno()).st_size
+        if size < item.position:
+            self.log(f"Warning: '{item.path}' was truncated.", 'warning')
+            item.file.seek(0)
+            item.position = 0
+            item.partial = b''
+        if size == item.position:
+            return []
+        data = item.file.read(min(size - item.position, FOLLOW_READ_LIMIT))
+        item.position += len(data)
+        lines = (item.partial + data).split(b'\n')
+        item.partial = lines.pop()
+        return [_decode(line) for line in lines]
 
 if __name__ == "__main__":
     command = "-n 5 *.py"  # 示例命令
@@ -1,14 +1,95 @@
 import argparse
 import os
 import tarfile
-from prompt_toolkit import HTML, print_formatted_text as print
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Deque, Optional
 from cmds.base import Command
+from cmds.core.fileops import Progress, is_real_dir, scan_tree
+
+GZIP_LEVEL = 6                  # gzip 压缩级别，与 gzip 和 pigz 的默认值相同
+GZIP_BLOCK_SIZE = 1 << 20       # 并行 gzip 时每个线程独立压缩的块大小
+COPY_BUFFER_SIZE = 1 << 20      # 把文件内容写入归档时每次读取的字节数
+REFRESH_MEMBERS = 256           # 每写入这么多个成员刷新一次进度
+
+# 归档文件的扩展名对应的压缩方式
+COMPRESSION_SUFFIXES = {
+    '.tar.gz': 'gz', '.tgz': 'gz', '.taz': 'gz',
+    '.tar.bz2': 'bz2', '.tbz': 'bz2', '.tbz2': 'bz2', '.tz2': 'bz2',
+    '.tar.xz': 'xz', '.txz': 'xz',
+}
+
+
+class ParallelGzipWriter:
+    """
+    多线程 gzip 输出流：写入的数据按块切开，每块在线程池中独立压缩成一个完整的 gzip 成员，
+    按顺序首尾相接写入底层文件。与 pigz 输出的单个 gzip 成员不同，结果由多个成员组成，
+    按 gzip 格式仍是合法的文件，gzip、pigz 和 Python 的 gzip/tarfile 都能直接解压。zlib 压缩时会释放 GIL，线程可以同时占用多个 CPU 核。
+    """
+
+    def __init__(self, fileobj: BinaryIO, threads: int, level: int = GZIP_LEVEL, block_size: int = GZIP_BLOCK_SIZE):
+        """
+        :param fileobj: 写入压缩结果的二进制文件，由调用者关闭。
+        :param threads: 压缩线程数。
+        :param level: 压缩级别。
+        :param block_size: 每个 gzip 成员压缩前的大小。
+        """
+        self.fileobj = fileobj
+        self.level = level
+        self.block_size = block_size
+        self.max_pending = threads * 2      # 最多同时在压缩或等待写出的块数，限制内存占用
+        self.executor = ThreadPoolExecutor(threads)
+        self.pending: Deque[Future] = deque()
+        self.buffer = bytearray()
+        self.written = False
+
+    def write(self, data: bytes) -> int:
+        if not self.buffer and len(data) == self.block_size:
+            # tarfile 的流模式按 bufsize 整块写入，正好是一块时不必复制
+            self._submit(bytes(data))
+            return len(data)
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            self._submit(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def close(self):
+        """
+        压缩剩余的数据并等待所有块写出。没有写入任何数据时也输出一个空的 gzip 成员。
+        """
+        try:
+            if self.buffer or not self.written:
+                self._submit(bytes(self.buffer))
+                self.buffer.clear()
+            while self.pending:
+                self.fileobj.write(self.pending.popleft().result())
+        finally:
+            for future in self.pending:
+                future.cancel()
+            self.executor.shutdown()
+
+    def _submit(self, block: bytes):
+        self.written = True
+        self.pending.append(self.executor.submit(self._compress, block, self.level))
+        # 按提交顺序写出已经完成的块；积压过多时等待最早的块完成
+        while self.pending and (self.pending[0].done() or len(self.pending) > self.max_pending):
+            self.fileobj.write(self.pending.popleft().result())
+
+    @staticmethod
+    def _compress(block: bytes, level: int) -> bytes:
+        # wbits=31 时 zlib 自己输出 gzip 头和尾（CRC32 与长度）
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return compressor.compress(block) + compressor.flush()
+
 
 class TarCommand(Command):
 
-    def __init__(self, command: str) -> 'TarCommand':
+    @classmethod
+    def build_parser(cls) -> argparse.ArgumentParser:
         """
-        解析 tar 命令并返回 TarCommand 实例。
+        构建 tar 命令的参数解析器。
         """
         parser = argparse.ArgumentParser(description="Create or extract tar archives.", add_help=False)
         parser.add_argument("-x", "--extract", action="store_true", help="Extract files from the archive")
@@ -16,14 +97,18 @@ class TarCommand(Command):
         parser.add_argument("-v", "--verbose", action="store_true", help="Show verbose output")
         parser.add_argument("-f", "--file", type=str, required=True, help="Name of the tar file")
         parser.add_argument("-C", "--directory", type=str, help="Change to directory DIR before performing any actions")
-        
-        self.parser = parser
-        super().__init__(command)
+        parser.add_argument("-z", "--gzip", dest="compression", action="store_const", const="gz", help="Compress the archive with gzip")
+        parser.add_argument("-j", "--bzip2", dest="compression", action="store_const", const="bz2", help="Compress the archive with bzip2")
+        parser.add_argument("-J", "--xz", dest="compression", action="store_const", const="xz", help="Compress the archive with xz")
+        parser.add_argument("--threads", type=int, default=0, help="Number of gzip compression threads (default: number of CPUs, 1 disables parallel gzip)")
+        parser.add_argument("files", nargs="*", type=str, help="Files or directories to add to the archive")
+        return parser
 
     @Command.safe_exec
     def execute(self):
         if not self.extract and not self.create:
-            print(HTML("<error>Error: Must specify either -c to create or -x to extract.</error>"), style=self.log_style)
+            self.log("Error: Must specify either -c to create or -x to extract.")
+            self.status = 1
             return
 
         tar_file = self.normabs(self.file)
@@ -35,7 +120,8 @@ class TarCommand(Command):
 
     def extract_tar(self, tar_file):
         if not os.path.exists(tar_file):
-            print(HTML(f"<error>Error: Tar file '{tar_file}' does not exist.</error>"), style=self.log_style)
+            self.log(f"Error: Tar file '{tar_file}' does not exist.")
+            self.status = 1
             return
 
         extract_path = self.directory if self.directory else os.getcwd()
@@ -45,19 +131,120 @@ class TarCommand(Command):
             with tarfile.open(tar_file, "r") as tar:
                 tar.extractall(path=extract_path)
                 if self.verbose:
-                    print(HTML(f"Extracted files from <aaa fg='ansiyellow'>'{tar_file}'</aaa> to <aaa fg='ansigreen'>'{extract_path}'</aaa>"))
+                    self.log(f"Extracted files from '{tar_file}' to '{extract_path}'", 'success')
         except Exception as e:
-            print(HTML(f"<critical>Critical Error: Failed to extract '{tar_file}': {e}</critical>"), style=self.log_style)
+            self.log(f"Critical Error: Failed to extract '{tar_file}': {e}", 'critical')
+            self.status = 1
 
     def create_tar(self, tar_file):
-        if os.path.exists(tar_file) and not self.force:
-            print(HTML(f"<error>Error: Tar file '{tar_file}' already exists. Use -f to force overwrite.</error>"), style=self.log_style)
+        """
+        创建归档：按参数的顺序用 scandir 逐项遍历，边遍历边写入，不预先收集整棵目录树。
+        使用与 GNU tar 默认相同的 GNU 格式，成员头比 pax 格式简单。
+        压缩方式由 -z/-j/-J 指定，否则按归档文件的扩展名推断；gzip 默认在多个线程中分块压缩。
+        与 GNU tar 一样，已存在的归档文件会被覆盖。
+        """
+        if not self.files:
+            self.log("Error: Cowardly refusing to create an empty archive.")
+            self.status = 1
+            return
+
+        base = self.normabs(self.directory) if self.directory else os.getcwd()
+        compression = self.compression or self._infer_compression(tar_file)
+        threads = self.threads or os.cpu_count() or 1
+        progress = Progress("Archived")
+
+        try:
+            with open(tar_file, 'wb') as out:
+                if compression == 'gz' and threads > 1:
+                    gzip_writer = ParallelGzipWriter(out, threads)
+                    try:
+                        with tarfile.open(fileobj=gzip_writer, mode='w|', format=tarfile.GNU_FORMAT,
+                                          bufsize=GZIP_BLOCK_SIZE, copybufsize=COPY_BUFFER_SIZE) as tar:
+                            self._add_members(tar, tar_file, base, progress)
+                    finally:
+                        gzip_writer.close()
+                else:
+                    options = {'compresslevel': GZIP_LEVEL} if compression == 'gz' else {}
+                    mode = f"w:{compression}" if compression else "w"
+                    with tarfile.open(fileobj=out, mode=mode, format=tarfile.GNU_FORMAT,
+                                      copybufsize=COPY_BUFFER_SIZE, **options) as tar:
+                        self._add_members(tar, tar_file, base, progress)
+        except Exception as e:
+            self.log(f"Critical Error: Failed to create '{tar_file}': {e}", 'critical')
+            self.status = 1
             return
+        finally:
+            progress.clear()
+
+        for path, message in progress.errors:
+            self.log(f"Error: Failed to add '{path}': {message}")
+        if progress.errors:
+            self.status = 1
+        if self.verbose or progress.displayed:
+            self.log(f"{progress.summary()} into '{tar_file}'", 'success')
+
+    @staticmethod
+    def _infer_compression(tar_file: str) -> Optional[str]:
+        name = tar_file.lower()
+        for suffix, compression in COMPRESSION_SUFFIXES.items():
+            if name.endswith(suffix):
+                return compression
+        return None
 
-        # To be implemented: code for creating a tar archive.
+    def _add_members(self, tar: tarfile.TarFile, tar_file: str, base: str, progress: Progress):
+        """
+        依次把每个参数（支持通配符）及其下的目录树写入归档。成员名相对于 -C 指定的目录或当前目录，
+        不在其下的去掉开头的盘符和分隔符。归档文件本身不会被加入。
+        """
+        archive = os.path.normcase(tar_file)
+        for pattern in self.files:
+            paths = self.get_file_list(os.path.join(base, os.path.expanduser(pattern)), traverse=False)
+            if not paths:
+                progress.fail(pattern, FileNotFoundError("No such file or directory"))
+                continue
+            for path in paths:
+                path = os.path.normpath(path)
+                relative = os.path.relpath(path, base) if self._is_under(path, base) else None
+                if relative is None or relative.startswith(os.pardir):
+                    relative = os.path.splitdrive(path)[1].lstrip(os.sep + '/')
+                self._add_member(tar, path, relative, archive, progress)
+                # 指向目录的符号链接和目录联接只写入链接本身，不进入其中
+                if is_real_dir(path):
+                    for name, entry, _ in scan_tree(path, progress):
+                        self._add_member(tar, entry.path, os.path.join(relative, name), archive, progress)
+
+    @staticmethod
+    def _is_under(path: str, base: str) -> bool:
+        return path == base or path.startswith(base.rstrip(os.sep) + os.sep)
+
+    @staticmethod
+    def _add_member(tar: tarfile.TarFile, path: str, arcname: str, archive: str, progress: Progress):
+        """
+        写入一个成员，目录只写入目录项本身。无法读取的文件记录为错误并跳过。
+        """
+        try:
+            info = tar.gettarinfo(path, arcname)
+            if info is None:
+                # 套接字等 tar 不支持的类型
+                return
+            if info.isreg() and os.path.normcase(path) == archive:
+                return
+            # 与 GNU tar 默认的格式一样只保存整秒；小数的修改时间会让每个成员多出一个 1 KiB 的 pax 扩展头
+            info.mtime = int(info.mtime)
+            if info.isreg():
+                with open(path, 'rb') as f:
+                    tar.addfile(info, f)
+            else:
+                tar.addfile(info)
+        except OSError as e:
+            progress.fail(path, e)
+            return
+        progress.add(info.size if info.isreg() else 0)
+        if progress.files % REFRESH_MEMBERS == 0:
+            progress.refresh()
 
 # 示例用法
 if __name__ == "__main__":
-    command = "-cvf __pycache__ __pycache__.tar.gz"  # 示例命令
+    command = "-cvf __pycache__.tar.gz __pycache__"  # 示例命令
     tar_command = TarCommand(command)
-    tar_command.execute()
\ No newline at end of file
+    tar_command.execute()
@@ -5,18 +5,17 @@ from cmds.base import Command
 
 class TouchCommand(Command):
 
-    def __init__(self, command: str) -> 'TouchCommand':
+    @classmethod
+    def build_parser(cls) -> argparse.ArgumentParser:
         """
-        解析 touch 命令并返回 TouchCommand 实例。
+        构建 touch 命令的参数解析器。
         """
         parser = argparse.ArgumentParser(description="Change file timestamps or create empty files.", add_help=False)
         parser.add_argument("-c", "--no-create", action="store_true", help="Do not create any files.")
         parser.add_argument("-m", "--modify", action="store_true", help="Change only the modification time.")
         parser.add_argument("-a", "--access", action="store_true", help="Change only the access time.")
         parser.add_argument("files", nargs="+", help="File(s) to be created or updated.")
-
-        self.parser = parser
-        super().__init__(command)
+        return parser
 
     @Command.safe_exec
     def execute(self):
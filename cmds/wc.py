@@ -1,12 +1,24 @@
 import argparse
+import codecs
 import os
-from prompt_toolkit import HTML, print_formatted_text as print
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
 from cmds.base import Command
+from cmds.core.pipeline import iter_batches
+
+CHUNK_SIZE = 1 << 20        # 每次读取的字节数
+PARALLEL_MIN_FILES = 4      # 文件数达到该值时并行统计
+FIELDS = ('lines', 'words', 'chars', 'bytes')   # 输出列的顺序，与 GNU wc 相同
+
+Counts = Tuple[int, int, int, int]     # 按 FIELDS 顺序的统计结果
+
 
 class WcCommand(Command):
-    def __init__(self, command: str) -> 'WcCommand':
+    @classmethod
+    def build_parser(cls) -> argparse.ArgumentParser:
         """
-        解析 wc 命令并返回 WcCommand 实例。
+        构建 wc 命令的参数解析器。
         """
         parser = argparse.ArgumentParser(description="Print newline, word, and byte counts for each FILE.", add_help=False)
         parser.add_argument("-l", "--lines", action="store_true", help="Print the number of lines")
@@ -14,58 +26,126 @@ class WcCommand(Command):
         parser.add_argument("-b", "--bytes", action="store_true", help="Print the number of bytes")
         parser.add_argument("-c", "--chars", action="store_true", help="Print the number of characters")
         parser.add_argument("files", nargs="*", type=str, help="Files to process")
+        return parser
+
+    def run(self, input_lines=None):
+        # 没有指定任何统计项时，与 GNU wc 一样输出行数、字数和字节数
+        if not (self.lines or self.words or self.bytes or self.chars):
+            self.lines = self.words = self.bytes = True
+        selected = [i for i, field in enumerate(FIELDS) if getattr(self, field)]
+
+        if input_lines is not None:
+            # 从流中读取内容，流中的行不含换行符，统计时补上
+            yield from self._format([(None, self._count_lines(input_lines))], selected)
+            return
 
-        self.parser = parser
-        super().__init__(command)
+        if not self.files:
+            self.log("Error: No files specified and no input stream provided.")
+            return
 
-    @Command.safe_exec
-    def execute(self, input_lines=None):
-        if input_lines:
-            # 从流中读取内容
-            self._count_lines(input_lines)
+        paths = []
+        for file_path in self.files:
+            file_path = self.normabs(file_path)
+            file_lists = self.get_file_list(file_path, include_dirs=False)
+            if not file_lists:
+                self.status = 1
+                self.log(f"Error: File '{file_path}' does not exist or is not a file.")
+            paths.extend(file_lists)
+
+        if len(paths) >= PARALLEL_MIN_FILES:
+            # 读取文件时会释放 GIL，按块计数的开销很小，线程足以让多个文件的读取重叠
+            with ThreadPoolExecutor() as executor:
+                results = list(executor.map(self._try_count_file, paths))
         else:
-            if not self.files:
-                print(HTML("<error>Error: No files specified and no input stream provided.</error>"), style=self.log_style)
-                return
-
-            for file_path in self.files:
-                file_path = self.normabs(file_path)
-                file_lists = self.get_file_list(file_path)
-
-                if not file_lists:
-                    print(HTML(f"<error>Error: File '{file_path}' does not exist or is not a file.</error>"), style=self.log_style)
-                    continue
-
-                for file in file_lists:
-                    print(HTML(f"<aaa bg='ansiblue'>{file}:</aaa>"))
-                    try:
-                        with open(file, 'r', encoding='utf-8') as f:
-                            lines = f.readlines()
-                            self._count_lines(lines)
-                    except Exception as e:
-                        print(HTML(f"<critical>Critical Error: Failed to read file '{file}': {e}</critical>"), style=self.log_style)
-
-    def _count_lines(self, lines):
+            results = [self._try_count_file(path) for path in paths]
+
+        rows = []
+        for path, (counts, error) in zip(paths, results):
+            if error is not None:
+                self.status = 1
+                self.log(f"Critical Error: Failed to read file '{path}': {error}", 'critical')
+            else:
+                rows.append((path, counts))
+        if len(rows) > 1:
+            rows.append(("total", tuple(sum(column) for column in zip(*(counts for _, counts in rows)))))
+        yield from self._format(rows, selected)
+
+    @staticmethod
+    def _format(rows: List[Tuple[Optional[str], Counts]], selected: List[int]) -> Iterable[str]:
         """
-        计算并输出行数、字数、字节数和字符数。
+        输出对齐的统计表：每行是选中的各项统计，后面跟文件名，所有数字右对齐到同一宽度。
         """
-        line_count = len(lines)
-        word_count = sum(len(line.split()) for line in lines)
-        byte_count = sum(len(line.encode('utf-8')) for line in lines)
-        char_count = sum(len(line) for line in lines)  # UTF-8字符数，包含Unicode字符
-
-        if self.lines:
-            print(f"Lines: {line_count}")
-        if self.words:
-            print(f"Words: {word_count}")
-        if self.bytes:
-            print(f"Bytes: {byte_count}")
-        if self.chars:
-            print(f"Characters: {char_count}")
-        
-        # 打印所有信息
-        if not (self.lines or self.words or self.bytes or self.chars):
-            print(f"{line_count} {word_count} {byte_count} {char_count}")
+        if not rows:
+            return
+        width = max(len(str(counts[i])) for _, counts in rows for i in selected)
+        for name, counts in rows:
+            cells = ' '.join(str(counts[i]).rjust(width) for i in selected)
+            yield f"{cells} {name}" if name is not None else cells
+
+    def _try_count_file(self, path: str) -> Tuple[Optional[Counts], Optional[Exception]]:
+        try:
+            return self._count_file(path), None
+        except Exception as e:
+            return None, e
+
+    def _count_file(self, path: str) -> Counts:
+        """
+        按二进制块统计一个文件：行数和字节数直接在字节上计算，只有统计字数或字符数时才解码。
+        只统计字节数时直接使用普通文件的大小，不读取内容。
+        """
+        with open(path, 'rb', buffering=0) as f:
+            info = os.fstat(f.fileno())
+            if not (self.lines or self.words or self.chars) and stat.S_ISREG(info.st_mode):
+                return 0, 0, 0, info.st_size
+
+            decode = self.words or self.chars
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace') if decode else None
+            lines = words = chars = size = 0
+            in_word = False     # 上一块是否以单词中间结束，跨块的单词只计一次
+            buffer = bytearray(CHUNK_SIZE)
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                chunk = buffer if n == CHUNK_SIZE else buffer[:n]
+                size += n
+                lines += chunk.count(b'\n')
+                if decode:
+                    text = decoder.decode(chunk)
+                    words, chars, in_word = self._count_text(text, words, chars, in_word)
+            if decode:
+                words, chars, _ = self._count_text(decoder.decode(b'', final=True), words, chars, in_word)
+            return lines, words, chars, size
+
+    @staticmethod
+    def _count_text(text: str, words: int, chars: int, in_word: bool) -> Tuple[int, int, bool]:
+        """
+        累加一段文本的字数和字符数。
+
+        :param in_word: 前一段文本是否以非空白字符结束。
+        :return: (字数, 字符数, 这段文本之后是否处于单词中间)。
+        """
+        if not text:
+            return words, chars, in_word
+        words += len(text.split())
+        if in_word and not text[0].isspace():
+            words -= 1
+        return words, chars + len(text), not text[-1].isspace()
+
+    def _count_lines(self, lines: Iterable[str]) -> Counts:
+        """
+        分批统计管道输入，每批拼接成一段文本后整体计数。
+        """
+        line_count = words = chars = size = 0
+        for batch in iter_batches(lines, 4096):
+            text = '\n'.join(batch) + '\n'
+            line_count += len(batch)
+            if self.words:
+                words += len(text.split())
+            chars += len(text)
+            if self.bytes:
+                size += len(text.encode('utf-8', errors='replace'))
+        return line_count, words, chars, size
 
 if __name__ == "__main__":
     command = "-lwcb *.py"  # 统计行数、字数和字节数
@@ -5,9 +5,10 @@ from prompt_toolkit import HTML, print_formatted_text as print
 from cmds.base import Command
 
 class WgetCommand(Command):
-    def __init__(self, command: str) -> 'WgetCommand':
+    @classmethod
+    def build_parser(cls) -> argparse.ArgumentParser:
         """
-        解析 wget 命令并返回 WgetCommand 实例。
+        构建 wget 命令的参数解析器。
         """
         parser = argparse.ArgumentParser(description="Download files from the web.", add_help=False)
         parser.add_argument("-O", "--output-document", type=str, help="Write documents to the specified file.")
@@ -15,9 +16,7 @@ class WgetCommand(Command):
         parser.add_argument("-v", "--verbose", action="store_true", help="Print detailed output (default).")
         parser.add_argument("-c", "--continue", action="store_true", dest="continue_", help="Resume a partially downloaded file.")
         parser.add_argument("url", type=str, help="URL to download the file from.")
-        
-        self.parser = parser
-        super().__init__(command)
+        return parser
 
     @Command.safe_exec
     def execute(self):
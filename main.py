@@ -19,6 +19,7 @@ user = getpass.getuser()
 bindings = KeyBindings()
 history_path = os.path.join(os.path.dirname(__file__), 'history.txt')
 normabs = lambda x: os.path.normpath(os.path.abspath(x.replace('~', os.path.expanduser('~'))))
+path_lister = LsCommand('')    # Tab 补全时复用同一个实例列出目录，不必每次按键都重新解析参数
 
 class CmdHistory:
     def __init__(self, max_size=100):
@@ -132,7 +133,7 @@ def complete_path(event):
     path = path.replace('~', os.path.expanduser('~'))
     dirname = os.path.dirname(path)
     basename = os.path.basename(path)
-    files_info = LsCommand(dirname).get_file_info_list(dirname)
+    files_info = path_lister.get_file_info_list(dirname)
     suggestions = []
     
     for file in files_info:
@@ -151,7 +152,7 @@ def complete_path(event):
             CmdWindow.session.app.current_buffer.insert_text(' ')
     else:
         if CmdWindow.tab_two:
-            LsCommand(f"-a '{path}*'").execute()    # 需要加上两个双引号确保解析正确
+            LsCommand(('-a', f'{path}*')).execute()    # 直接传入拆分好的参数，路径中的引号不会被当作语法
         CmdWindow.tab_two = not CmdWindow.tab_two
    
 # 定义粘贴快捷键 Ctrl+V
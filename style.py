@@ -61,7 +61,7 @@ class ShellLexer(RegexLexer):
         ],
         'basic': [
             (r'\b(if|fi|else|while|in|do|done|for|then|return|case|'
-             r'select|continue|until|esac|elif)(\s*)\b',
+             r'select|continue|until|esac|elif|time)(\s*)\b',
              bygroups(Keyword, Whitespace)),
             (rf'\b({"|".join(system_cmds)})(?=[\s)`])', Keyword), 
             (rf'\b({"|".join(commands)})', Keyword), 